@@ -1,9 +1,10 @@
 import streamlit as st
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-from services.database import is_database_ready
+from services.database import is_database_ready, database_needs_migration
 from services.vector_store import is_vector_store_ready
 from components.chat_interface import (
     init_session_state,
@@ -12,10 +13,13 @@ from components.chat_interface import (
     add_assistant_message,
 )
 from components.response_display import render_response
-from components.quality_indicator import render_quality_badge
-from core.agent import process_query_stream, AgentStep
+from components.quality_indicator import render_quality_badge, render_quality_placeholder
+from core.agent import process_query_stream, AgentStep, QualityUpdate
 from models.schemas import AgentResponse
 
+# Minimum interval between streamed-text redraws (~25 fps)
+FLUSH_MS = 40
+
 # Page config
 st.set_page_config(
     page_title="Fraud Analysis Agent",
@@ -36,6 +40,25 @@ st.markdown("""
 init_session_state()
 
 
+# Data source probes only need refreshing occasionally, not on every rerun
+@st.cache_data(ttl=30, show_spinner=False)
+def _database_ready() -> bool:
+    return is_database_ready()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _database_needs_migration() -> bool:
+    try:
+        return database_needs_migration()
+    except Exception:
+        return False
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _vector_store_ready() -> bool:
+    return is_vector_store_ready()
+
+
 # Sidebar
 with st.sidebar:
     st.title("🔍 Fraud Analysis Agent")
@@ -43,13 +66,15 @@ with st.sidebar:
 
     # System status
     st.subheader("System Status")
-    db_ready = is_database_ready()
-    vs_ready = is_vector_store_ready()
+    db_ready = _database_ready()
+    vs_ready = _vector_store_ready()
 
     st.markdown(f"{'✅' if db_ready else '❌'} **SQLite Database**")
     st.markdown(f"{'✅' if vs_ready else '❌'} **ChromaDB Vector Store**")
 
-    if not db_ready or not vs_ready:
+    if not db_ready and _database_needs_migration():
+        st.warning("Database schema is out of date. Run `python scripts/setup_data.py --migrate`.")
+    elif not db_ready or not vs_ready:
         st.warning("Data sources not initialized. Run `python scripts/setup_data.py` first.")
 
     st.markdown("---")
@@ -73,42 +98,24 @@ with st.sidebar:
     st.caption("Built with Together AI, SQLite & ChromaDB")
 
 
-# Main chat area
-st.header("💬 Chat")
-
-render_chat_history()
-
-# Handle pending question from sidebar
-pending = st.session_state.pop("pending_question", None)
-
-# Chat input
-user_input = st.chat_input("Ask a question about fraud data or the fraud report...")
-
-question = pending or user_input
-
-if question:
-    add_user_message(question)
-    with st.chat_message("user"):
-        st.markdown(question)
-
+@st.fragment
+def _run_agent(question: str, chat_history: list[dict]):
+    # Scoped to a fragment so streaming updates only rerun the assistant message
     with st.chat_message("assistant"):
         # Status container for step-by-step updates
         status_container = st.status("Processing your question...", expanded=True)
         # Placeholder for streamed answer text
         answer_placeholder = st.empty()
+        # Slot for the quality badge, filled as soon as scoring completes
+        badge_slot = st.empty()
+        # Slot for charts and sources, shown before scoring completes
+        details_slot = st.empty()
         # Will hold the final AgentResponse
         final_response = None
         streamed_text = ""
         is_streaming = False
 
-        # Build conversation history for context
-        chat_history = []
-        for msg in st.session_state.messages:
-            chat_history.append({
-                "role": msg["role"],
-                "content": msg["content"],
-            })
-
+        last_flush = time.monotonic()
         for event in process_query_stream(question, history=chat_history):
             if isinstance(event, AgentStep):
                 # Show pipeline step in the status expander
@@ -122,17 +129,37 @@ if question:
                 if event.step == "synthesize":
                     is_streaming = True
 
-                # When scoring starts, stop streaming mode
+                # When scoring starts, stop streaming mode and render markdown once
                 if event.step == "score":
                     is_streaming = False
+                    if streamed_text:
+                        answer_placeholder.markdown(streamed_text)
 
             elif isinstance(event, str):
-                # Streaming token from LLM
+                # Streaming token from LLM; redraw at most once per FLUSH_MS.
+                # Plain text while streaming avoids re-parsing markdown per redraw.
                 streamed_text += event
-                answer_placeholder.markdown(streamed_text + "▌")
+                now = time.monotonic()
+                if (now - last_flush) * 1000 >= FLUSH_MS:
+                    if is_streaming:
+                        answer_placeholder.text(streamed_text + "▌")
+                    else:
+                        answer_placeholder.markdown(streamed_text + "▌")
+                    last_flush = now
+
+            elif isinstance(event, QualityUpdate):
+                if final_response:
+                    with badge_slot.container():
+                        render_quality_badge(event.quality_score.score, final_response.query_type.value)
 
             elif isinstance(event, AgentResponse):
                 final_response = event
+                if event.is_preliminary:
+                    # Show the answer's charts and sources while scoring runs
+                    with badge_slot.container():
+                        render_quality_placeholder(event.query_type.value)
+                    with details_slot.container():
+                        render_response(event, skip_answer=True, skip_quality=True, key=f"attempt_{event.retry_count}")
 
         # Finalize the streamed text (remove cursor)
         if streamed_text:
@@ -154,10 +181,12 @@ if question:
                 )
 
                 # Quality badge
-                render_quality_badge(score, final_response.query_type.value)
+                with badge_slot.container():
+                    render_quality_badge(score, final_response.query_type.value)
 
                 # Render charts, sources, quality details (but NOT the answer text again)
-                render_response(final_response, skip_answer=True)
+                with details_slot.container():
+                    render_response(final_response, skip_answer=True, key="final")
 
                 # Store in chat history
                 metadata = {
@@ -165,3 +194,25 @@ if question:
                     "query_type": final_response.query_type.value,
                 }
                 add_assistant_message(final_response.answer, metadata=metadata)
+
+
+# Main chat area
+st.header("💬 Chat")
+
+render_chat_history()
+
+# Handle pending question from sidebar
+pending = st.session_state.pop("pending_question", None)
+
+# Chat input
+user_input = st.chat_input("Ask a question about fraud data or the fraud report...")
+
+question = pending or user_input
+
+if question:
+    add_user_message(question)
+    with st.chat_message("user"):
+        st.markdown(question)
+
+    # Conversation history for context, maintained incrementally
+    _run_agent(question, st.session_state.chat_history_cache)
@@ -4,6 +4,9 @@ import streamlit as st
 def init_session_state():
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "chat_history_cache" not in st.session_state:
+        # Role/content pairs for the agent, kept in sync with messages
+        st.session_state.chat_history_cache = []
     if "processing" not in st.session_state:
         st.session_state.processing = False
 
@@ -30,6 +33,7 @@ def _render_metadata(metadata: dict):
 
 def add_user_message(content: str):
     st.session_state.messages.append({"role": "user", "content": content})
+    st.session_state.chat_history_cache.append({"role": "user", "content": content})
 
 
 def add_assistant_message(content: str, metadata: dict | None = None):
@@ -37,3 +41,4 @@ def add_assistant_message(content: str, metadata: dict | None = None):
     if metadata:
         msg["metadata"] = metadata
     st.session_state.messages.append(msg)
+    st.session_state.chat_history_cache.append({"role": "assistant", "content": content})
@@ -20,3 +20,20 @@ def render_quality_badge(score: int, query_type: str):
         </div>""",
         unsafe_allow_html=True,
     )
+
+
+def render_quality_placeholder(query_type: str):
+    type_icon = {"sql": "📊", "rag": "📄", "hybrid": "📊📄"}.get(query_type, "❓")
+
+    st.markdown(
+        f"""<style>
+            @keyframes quality-pulse {{ 0%, 100% {{ opacity: 1; }} 50% {{ opacity: 0.4; }} }}
+        </style>
+        <div style="display: flex; gap: 12px; align-items: center; padding: 4px 0;">
+            <span style="background: gray; color: white; padding: 2px 10px; border-radius: 12px; font-size: 0.85em; animation: quality-pulse 1.5s ease-in-out infinite;">
+                Scoring…
+            </span>
+            <span style="font-size: 0.85em;">{type_icon} {query_type.upper()}</span>
+        </div>""",
+        unsafe_allow_html=True,
+    )
@@ -1,18 +1,25 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
 from models.schemas import AgentResponse
 from models.enums import QueryType
 
+_TIME_KW = ("month", "date", "year", "day", "time", "period")
+_CAT_KW = {"category", "merchant", "state", "city", "job", "gender"}
 
-def render_response(response: AgentResponse, skip_answer: bool = False):
+
+def render_response(
+    response: AgentResponse,
+    skip_answer: bool = False,
+    skip_quality: bool = False,
+    key: str | None = None,
+):
+    # key keeps element IDs unique when a response is rendered more than once per run
     if not skip_answer:
         st.markdown(response.answer)
 
     # Render charts for SQL results
     if response.sql_result and not response.sql_result.error and response.sql_result.rows:
-        _render_sql_visualization(response)
+        _render_sql_visualization(response, key)
 
     # Render sources
     if response.sources:
@@ -21,21 +28,33 @@ def render_response(response: AgentResponse, skip_answer: bool = False):
                 st.markdown(f"- {src}")
 
     # Render quality details
-    if response.quality_score:
+    if response.quality_score and not skip_quality:
         _render_quality_details(response)
 
 
-def _render_sql_visualization(response: AgentResponse):
+def _render_sql_visualization(response: AgentResponse, key: str | None = None):
+    # Imported lazily so plotly is only loaded once a chart is needed
+    import plotly.express as px
+
     sql = response.sql_result
     if not sql or not sql.columns or not sql.rows:
         return
 
     df = pd.DataFrame(sql.rows, columns=sql.columns)
 
-    # Detect time-series data for line chart
-    time_cols = [c for c in df.columns if any(kw in c.lower() for kw in ["month", "date", "year", "day", "time", "period"])]
+    # Classify columns in a single pass
     numeric_cols = df.select_dtypes(include=["number", "float", "int"]).columns.tolist()
+    object_cols = set(df.select_dtypes(include="object").columns)
+    time_cols = []
+    cat_cols = []
+    for c in df.columns:
+        lc = c.lower()
+        if any(kw in lc for kw in _TIME_KW):
+            time_cols.append(c)
+        if c in object_cols or lc in _CAT_KW:
+            cat_cols.append(c)
 
+    # Detect time-series data for line chart
     if time_cols and numeric_cols:
         with st.expander("📈 Chart", expanded=True):
             fig = px.line(
@@ -46,11 +65,10 @@ def _render_sql_visualization(response: AgentResponse):
                 markers=True,
             )
             fig.update_layout(xaxis_tickangle=-45, height=400)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(fig, use_container_width=True, key=f"{key}_line" if key else None)
 
     # Detect categorical data for bar chart
     elif len(df.columns) >= 2 and len(df) <= 30:
-        cat_cols = [c for c in df.columns if df[c].dtype == "object" or c.lower() in ["category", "merchant", "state", "city", "job", "gender"]]
         if cat_cols and numeric_cols:
             with st.expander("📊 Chart", expanded=True):
                 fig = px.bar(
@@ -62,11 +80,11 @@ def _render_sql_visualization(response: AgentResponse):
                     color_continuous_scale="Reds",
                 )
                 fig.update_layout(xaxis_tickangle=-45, height=400)
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(fig, use_container_width=True, key=f"{key}_bar" if key else None)
 
-    # Always show data table
+    # Always show data table; run_sql_query already caps results at MAX_RESULT_ROWS
     with st.expander("🗂️ Raw Data", expanded=False):
-        st.dataframe(df, use_container_width=True)
+        st.dataframe(df, use_container_width=True, key=f"{key}_data" if key else None)
 
 
 def _render_quality_details(response: AgentResponse):
@@ -1,5 +1,7 @@
 import logging
-from collections.abc import Generator
+import time
+from collections.abc import Generator, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from models.schemas import AgentResponse, SQLResult, RAGResult, QualityScore
 from models.enums import QueryType
@@ -15,7 +17,12 @@ logger = logging.getLogger(__name__)
 
 QUALITY_THRESHOLD = 3
 MAX_RETRIES = 2
+# Streamed tokens are coalesced before being yielded to the UI
+BATCH_CHARS = 32
+BATCH_MS = 15
 
+# Background workers for LLM calls that can overlap with UI rendering
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agent")
 
 @dataclass
 class AgentStep:
@@ -24,6 +31,13 @@ class AgentStep:
     detail: str = ""
 
 
+@dataclass
+class QualityUpdate:
+    # Emitted once background scoring finishes for a preliminary AgentResponse
+    quality_score: QualityScore
+    retry_count: int = 0
+
+
 def process_query(question: str, history: list[dict] | None = None) -> AgentResponse:
     # Non-streaming version (used by tests)
     result = None
@@ -33,7 +47,7 @@ def process_query(question: str, history: list[dict] | None = None) -> AgentResp
     return result
 
 
-def process_query_stream(question: str, history: list[dict] | None = None) -> Generator[AgentStep | AgentResponse | str, None, None]:
+def process_query_stream(question: str, history: list[dict] | None = None) -> Generator[AgentStep | AgentResponse | QualityUpdate | str, None, None]:
     question = sanitize_input(question)
     if not question:
         yield AgentResponse(
@@ -68,37 +82,41 @@ def process_query_stream(question: str, history: list[dict] | None = None) -> Ge
 
             sql_result = None
             rag_result = None
+            rag_pages = []
 
-            # Step 2a: SQL tool
-            if classification.query_type in [QueryType.SQL, QueryType.HYBRID]:
+            use_sql = classification.query_type in [QueryType.SQL, QueryType.HYBRID]
+            use_rag = classification.query_type in [QueryType.RAG, QueryType.HYBRID]
+            sql_query = classification.sql_query_hint or question
+            # The classifier's draft and cached SQL are only used on the first
+            # attempt; retries ask the model for a fresh query
+            draft_sql = classification.sql_query if attempt == 0 else None
+            use_cache = attempt == 0
+            rag_query = classification.rag_search_hint or question
+
+            if use_sql and use_rag:
+                # Step 2: run both tools in parallel, reporting whichever finishes first
                 yield AgentStep("sql", "📊 Generating and executing SQL query...")
-                try:
-                    sql_result = run_sql_query(classification.sql_query_hint or question)
-                    if sql_result.error:
-                        logger.warning(f"SQL tool error: {sql_result.error}")
-                        yield AgentStep("sql_done", f"⚠️ SQL query issue: {sql_result.error[:80]}")
+                yield AgentStep("rag", "📄 Searching document for relevant information...")
+                sql_future = _executor.submit(_run_sql_tool, sql_query, draft_sql, use_cache)
+                rag_future = _executor.submit(_run_rag_tool, rag_query)
+                for future in as_completed([sql_future, rag_future]):
+                    if future is sql_future:
+                        sql_result, step = future.result()
                     else:
-                        yield AgentStep("sql_done", f"✅ SQL returned {sql_result.row_count} rows", sql_result.query)
-                except Exception as e:
-                    logger.error(f"SQL tool exception: {e}")
-                    sql_result = SQLResult(query="", error=handle_sql_error(e))
-                    yield AgentStep("sql_done", f"❌ SQL error: {str(e)[:80]}")
+                        rag_result, rag_pages, step = future.result()
+                    yield step
+
+            # Step 2a: SQL tool
+            elif use_sql:
+                yield AgentStep("sql", "📊 Generating and executing SQL query...")
+                sql_result, step = _run_sql_tool(sql_query, draft_sql, use_cache)
+                yield step
 
             # Step 2b: RAG tool
-            if classification.query_type in [QueryType.RAG, QueryType.HYBRID]:
+            elif use_rag:
                 yield AgentStep("rag", "📄 Searching document for relevant information...")
-                try:
-                    rag_result = search_docs(classification.rag_search_hint or question)
-                    if rag_result.error:
-                        logger.warning(f"RAG tool error: {rag_result.error}")
-                        yield AgentStep("rag_done", f"⚠️ Document search issue: {rag_result.error[:80]}")
-                    else:
-                        pages = sorted({m.get("page_number", "?") for m in rag_result.metadatas})
-                        yield AgentStep("rag_done", f"✅ Found {len(rag_result.chunks)} relevant chunks (pages {', '.join(str(p) for p in pages)})")
-                except Exception as e:
-                    logger.error(f"RAG tool exception: {e}")
-                    rag_result = RAGResult(error=handle_rag_error(e))
-                    yield AgentStep("rag_done", f"❌ RAG error: {str(e)[:80]}")
+                rag_result, rag_pages, step = _run_rag_tool(rag_query)
+                yield step
 
             # Graceful degradation
             if classification.query_type == QueryType.HYBRID:
@@ -112,30 +130,45 @@ def process_query_stream(question: str, history: list[dict] | None = None) -> Ge
 
             try:
                 answer_chunks = []
-                for token in synthesize_response_stream(
+                for text in _batch_tokens(synthesize_response_stream(
                     question=question,
                     query_type=classification.query_type,
                     sql_result=sql_result,
                     rag_result=rag_result,
                     history=history,
-                ):
-                    answer_chunks.append(token)
-                    yield token  # stream token to UI
+                )):
+                    answer_chunks.append(text)
+                    yield text  # stream batched tokens to UI
                 answer = "".join(answer_chunks)
             except Exception as e:
                 logger.error(f"Synthesis error: {e}")
                 answer = handle_llm_error(e)
                 yield answer  # yield the error as the full text
 
-            # Step 4: Quality scoring
+            # Step 4: Quality scoring (runs in the background while the UI renders)
             yield AgentStep("score", "🔍 Evaluating response quality...")
+            score_future = _executor.submit(
+                score_response,
+                question=question,
+                answer=answer,
+                sql_result=sql_result,
+                rag_result=rag_result,
+            )
+
+            sources = _build_sources(sql_result, rag_result, rag_pages)
+
+            yield AgentResponse(
+                answer=answer,
+                query_type=classification.query_type,
+                sql_result=sql_result,
+                rag_result=rag_result,
+                sources=sources,
+                retry_count=attempt,
+                is_preliminary=True,
+            )
+
             try:
-                quality = score_response(
-                    question=question,
-                    answer=answer,
-                    sql_result=sql_result,
-                    rag_result=rag_result,
-                )
+                quality = score_future.result()
             except Exception as e:
                 logger.error(f"Quality scoring error: {e}")
                 quality = QualityScore(
@@ -145,11 +178,11 @@ def process_query_stream(question: str, history: list[dict] | None = None) -> Ge
                     missing_information=[],
                 )
 
+            yield QualityUpdate(quality, retry_count=attempt)
+
             score_emoji = "🟢" if quality.score >= 4 else "🟡" if quality.score >= 3 else "🔴"
             yield AgentStep("score_done", f"{score_emoji} Quality score: {quality.score}/5", quality.reasoning)
 
-            sources = _build_sources(sql_result, rag_result)
-
             current_response = AgentResponse(
                 answer=answer,
                 query_type=classification.query_type,
@@ -170,6 +203,15 @@ def process_query_stream(question: str, history: list[dict] | None = None) -> Ge
 
             logger.warning(f"Quality score {quality.score} below threshold on attempt {attempt + 1}")
 
+            # Re-synthesizing cannot help when the query simply matched no rows
+            if (
+                classification.query_type == QueryType.SQL
+                and sql_result and not sql_result.error and sql_result.row_count == 0
+                and not rag_result
+            ):
+                logger.info("Skipping retries: no SQL rows to refine")
+                break
+
         # Return best after retries exhausted
         if best_response and best_response.quality_score and best_response.quality_score.score < QUALITY_THRESHOLD:
             best_response.answer += (
@@ -190,17 +232,65 @@ def process_query_stream(question: str, history: list[dict] | None = None) -> Ge
         )
 
 
-def _build_sources(sql_result: SQLResult | None, rag_result: RAGResult | None) -> list[str]:
+def _run_sql_tool(
+    query: str,
+    draft_sql: str | None = None,
+    use_cache: bool = True,
+) -> tuple[SQLResult, AgentStep]:
+    try:
+        sql_result = run_sql_query(query, draft_sql=draft_sql, use_cache=use_cache)
+        if sql_result.error:
+            logger.warning(f"SQL tool error: {sql_result.error}")
+            return sql_result, AgentStep("sql_done", f"⚠️ SQL query issue: {sql_result.error[:80]}")
+        return sql_result, AgentStep("sql_done", f"✅ SQL returned {sql_result.row_count} rows", sql_result.query)
+    except Exception as e:
+        logger.error(f"SQL tool exception: {e}")
+        return SQLResult(query="", error=handle_sql_error(e)), AgentStep("sql_done", f"❌ SQL error: {str(e)[:80]}")
+
+
+def _run_rag_tool(query: str) -> tuple[RAGResult, list[int], AgentStep]:
+    # Page numbers are computed once here and reused when building sources
+    try:
+        rag_result = search_docs(query)
+        if rag_result.error:
+            logger.warning(f"RAG tool error: {rag_result.error}")
+            return rag_result, [], AgentStep("rag_done", f"⚠️ Document search issue: {rag_result.error[:80]}")
+        pages = sorted({p for m in rag_result.metadatas if (p := m.get("page_number")) is not None})
+        return rag_result, pages, AgentStep("rag_done", f"✅ Found {len(rag_result.chunks)} relevant chunks (pages {', '.join(str(p) for p in pages)})")
+    except Exception as e:
+        logger.error(f"RAG tool exception: {e}")
+        return RAGResult(error=handle_rag_error(e)), [], AgentStep("rag_done", f"❌ RAG error: {str(e)[:80]}")
+
+
+def _batch_tokens(tokens: Iterable[str]) -> Generator[str, None, None]:
+    # Coalesce tokens into larger strings. The size threshold grows 1, 3, 9, ...
+    # up to BATCH_CHARS so the first token is still flushed immediately.
+    pending = []
+    pending_len = 0
+    threshold = 1
+    last = time.monotonic()
+    for token in tokens:
+        pending.append(token)
+        pending_len += len(token)
+        now = time.monotonic()
+        if pending_len >= threshold or (now - last) * 1000 >= BATCH_MS:
+            yield "".join(pending)
+            pending = []
+            pending_len = 0
+            threshold = min(threshold * 3, BATCH_CHARS)
+            last = now
+    if pending:
+        yield "".join(pending)
+
+
+def _build_sources(
+    sql_result: SQLResult | None,
+    rag_result: RAGResult | None,
+    rag_pages: list[int],
+) -> list[str]:
     sources = []
     if sql_result and not sql_result.error and sql_result.rows:
         sources.append(f"SQL: {sql_result.query}")
-    if rag_result and not rag_result.error and rag_result.chunks:
-        pages = set()
-        for meta in rag_result.metadatas:
-            page = meta.get("page_number")
-            if page:
-                pages.add(page)
-        if pages:
-            page_list = sorted(pages)
-            sources.append(f"Document: Understanding Credit Card Frauds (Pages {', '.join(str(p) for p in page_list)})")
+    if rag_result and not rag_result.error and rag_result.chunks and rag_pages:
+        sources.append(f"Document: Understanding Credit Card Frauds (Pages {', '.join(str(p) for p in rag_pages)})")
     return sources
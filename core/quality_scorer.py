@@ -1,7 +1,10 @@
-import json
+import hashlib
 import logging
+import threading
+import orjson
 from models.schemas import QualityScore, SQLResult, RAGResult
 from services.together_ai import chat_completion_routing
+from utils.helpers import extract_json_object
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +41,16 @@ Respond with ONLY a JSON object (no markdown, no code blocks):
 """
 
 
+# Per-item limits for the context sent to the scorer
+MAX_CELL_CHARS = 80
+MAX_CHUNK_CHARS = 400
+
+# Scores for identical (question, answer, context) triples, evicted FIFO
+SCORE_CACHE_SIZE = 256
+_score_cache: dict[str, QualityScore] = {}
+_score_cache_lock = threading.Lock()
+
+
 def score_response(
     question: str,
     answer: str,
@@ -48,10 +61,13 @@ def score_response(
     context_parts = []
 
     if sql_result and not sql_result.error and sql_result.rows:
-        rows_preview = sql_result.rows[:10]
+        # Compact JSON keeps the scoring prompt short; long cells are clipped
+        rows_preview = orjson.dumps([
+            dict(zip(sql_result.columns, (str(v)[:MAX_CELL_CHARS] for v in row)))
+            for row in sql_result.rows[:10]
+        ]).decode()
         context_parts.append(
             f"SQL Query: {sql_result.query}\n"
-            f"Columns: {sql_result.columns}\n"
             f"Sample rows: {rows_preview}\n"
             f"Total rows: {sql_result.row_count}"
         )
@@ -59,7 +75,7 @@ def score_response(
     if rag_result and not rag_result.error and rag_result.chunks:
         for chunk, meta in zip(rag_result.chunks[:5], rag_result.metadatas[:5]):
             page = meta.get("page_number", "?")
-            context_parts.append(f"[Page {page}]: {chunk[:500]}")
+            context_parts.append(f"[Page {page}]: {chunk[:MAX_CHUNK_CHARS]}")
 
     if not context_parts:
         return QualityScore(
@@ -71,6 +87,16 @@ def score_response(
 
     context = "\n\n".join(context_parts)
 
+    cache_key = hashlib.blake2b(
+        "\0".join((question, answer, context)).encode(),
+        digest_size=16,
+    ).hexdigest()
+    with _score_cache_lock:
+        cached = _score_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Reusing cached quality score for identical answer")
+        return cached
+
     messages = [
         {
             "role": "system",
@@ -85,24 +111,26 @@ def score_response(
 
     try:
         raw = chat_completion_routing(messages)
-        
-        raw = raw.strip()
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[-1]
-            raw = raw.rsplit("```", 1)[0]
-        raw = raw.strip()
 
-        data = json.loads(raw)
+        # Pull the JSON object out of any surrounding prose or code fences
+        data = orjson.loads(extract_json_object(raw))
 
         score = max(1, min(5, int(data.get("score", 3))))
-        return QualityScore(
+        quality = QualityScore(
             score=score,
             reasoning=data.get("reasoning", ""),
             has_hallucination=bool(data.get("has_hallucination", False)),
             missing_information=data.get("missing_information", []),
         )
 
-    except (json.JSONDecodeError, ValueError) as e:
+        # Only successful evaluations are cached; fallbacks below are not
+        with _score_cache_lock:
+            if len(_score_cache) >= SCORE_CACHE_SIZE:
+                _score_cache.pop(next(iter(_score_cache)))
+            _score_cache[cache_key] = quality
+        return quality
+
+    except (orjson.JSONDecodeError, ValueError) as e:
         logger.warning(f"Failed to parse quality score: {e}")
         return QualityScore(
             score=3,
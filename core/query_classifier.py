@@ -1,8 +1,12 @@
-import json
 import logging
+import re
+from functools import lru_cache
+import orjson
 from models.enums import QueryType
 from models.schemas import ClassificationResult
 from services.together_ai import chat_completion_routing
+from services.database import get_table_schema
+from utils.helpers import extract_json_object
 
 logger = logging.getLogger(__name__)
 
@@ -14,80 +18,122 @@ CLASSIFICATION_PROMPT = """You are a query classifier for a fraud analysis syste
 
 3. "hybrid" - Questions that need BOTH statistical data AND document knowledge. Examples: comparing dataset statistics with document claims, questions about specific report statistics (like EEA, H1 2023, cross-border).
 
+If sql or hybrid, also write the SQLite SELECT query that answers the data part of the question, using the schema below. Only SELECT is allowed; use trans_month for monthly grouping, ROUND() for decimals, and LIMIT 100 for non-aggregation queries.
+
 Respond with ONLY a JSON object (no markdown, no code blocks):
 {
     "query_type": "sql" or "rag" or "hybrid",
     "reasoning": "brief explanation",
     "sql_query_hint": "what to query if sql is needed, or null",
+    "sql_query": "complete SQLite SELECT query if sql is needed, or null",
     "rag_search_hint": "what to search if rag is needed, or null"
 }
 """
 
+SQL_KEYWORDS = [
+    "how many", "count", "rate", "trend", "average", "total",
+    "highest", "lowest", "most", "least", "percentage", "monthly",
+    "daily", "yearly", "over time", "fluctuate", "merchant", "category",
+    "transaction", "amount", "which", "top", "statistics",
+]
+RAG_KEYWORDS = [
+    "what are", "explain", "describe", "methods", "components",
+    "according to", "authors", "definition", "how does", "why",
+    "primary methods", "core components", "detection system",
+    "techniques", "strategies",
+]
+HYBRID_KEYWORDS = [
+    "eea", "cross-border", "h1 2023", "report", "compared to",
+    "outside the", "share of total",
+]
+
+
+def _compile_keywords(keywords: list[str]) -> re.Pattern:
+    # Longest phrases first so "primary methods" wins over "methods". Only the
+    # start is anchored, so plurals like "rates" still match but "accurate" does not.
+    alternation = "|".join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternation})")
+
+
+_SQL_RE = _compile_keywords(SQL_KEYWORDS)
+_RAG_RE = _compile_keywords(RAG_KEYWORDS)
+_HYBRID_RE = _compile_keywords(HYBRID_KEYWORDS)
+
 
 def classify_query(question: str, history: list[dict] | None = None) -> ClassificationResult:
-    messages = [
-        {"role": "system", "content": CLASSIFICATION_PROMPT},
-    ]
-    # Include recent conversation history for context on follow-up questions
-    if history:
-        for msg in history[-6:]:  # last 3 exchanges
-            messages.append({"role": msg["role"], "content": msg["content"]})
-    messages.append({"role": "user", "content": question})
+    # Unambiguous questions are classified locally without an LLM round trip
+    scores = _score_keywords(question)
+    sql_score, rag_score, hybrid_score = scores
+    if hybrid_score >= 1 or abs(sql_score - rag_score) >= 2:
+        logger.info(f"Keyword classification (sql={sql_score}, rag={rag_score}, hybrid={hybrid_score})")
+        return _keyword_classification(question, scores, "Keyword-based classification")
+    logger.info(f"Ambiguous keywords (sql={sql_score}, rag={rag_score}, hybrid={hybrid_score}); using LLM classifier")
+
+    # Only the last 3 exchanges are sent to the model, so they form the cache key
+    history_key = tuple((msg["role"], msg["content"]) for msg in (history or [])[-6:])
 
     try:
-        raw = chat_completion_routing(messages)
-        
-        # Clean up response
-        raw = raw.strip()
-        if raw.startswith("```"):
-            raw = raw.split("\n", 1)[-1]
-            raw = raw.rsplit("```", 1)[0]
-        raw = raw.strip()
-
-        data = json.loads(raw)
-        
-        query_type = data.get("query_type", "unknown")
-        if query_type not in ["sql", "rag", "hybrid"]:
-            query_type = "unknown"
-
-        return ClassificationResult(
-            query_type=QueryType(query_type),
-            reasoning=data.get("reasoning", ""),
-            sql_query_hint=data.get("sql_query_hint"),
-            rag_search_hint=data.get("rag_search_hint"),
-        )
-
-    except json.JSONDecodeError as e:
-        logger.warning(f"Failed to parse classification response: {e}. Raw: {raw}")
+        return _classify_cached(question, history_key)
+    except orjson.JSONDecodeError:
         return _fallback_classification(question)
     except Exception as e:
         logger.error(f"Classification error: {e}")
         return _fallback_classification(question)
 
 
+@lru_cache(maxsize=128)
+def _classify_cached(question: str, history_key: tuple[tuple[str, str], ...]) -> ClassificationResult:
+    # Failures raise instead of returning a fallback so they are never cached
+    # The schema lets the same round trip also draft the SQL, saving a
+    # separate generation call when the question is routed to the database
+    messages = [
+        {"role": "system", "content": CLASSIFICATION_PROMPT + "\n" + get_table_schema()},
+    ]
+    # Include recent conversation history for context on follow-up questions
+    for role, content in history_key:
+        messages.append({"role": role, "content": content})
+    messages.append({"role": "user", "content": question})
+
+    raw = chat_completion_routing(messages)
+
+    # Pull the JSON object out of any surrounding prose or code fences
+    try:
+        data = orjson.loads(extract_json_object(raw))
+    except orjson.JSONDecodeError:
+        logger.warning(f"Failed to parse classification response. Raw: {raw}")
+        raise
+
+    query_type = data.get("query_type", "unknown")
+    if query_type not in ["sql", "rag", "hybrid"]:
+        query_type = "unknown"
+
+    return ClassificationResult(
+        query_type=QueryType(query_type),
+        reasoning=data.get("reasoning", ""),
+        sql_query_hint=data.get("sql_query_hint"),
+        sql_query=data.get("sql_query") if query_type in ["sql", "hybrid"] else None,
+        rag_search_hint=data.get("rag_search_hint"),
+    )
+
+
 def _fallback_classification(question: str) -> ClassificationResult:
+    return _keyword_classification(question, _score_keywords(question), "Fallback keyword-based classification")
+
+
+def _score_keywords(question: str) -> tuple[int, int, int]:
     q = question.lower()
-    
-    sql_keywords = [
-        "how many", "count", "rate", "trend", "average", "total",
-        "highest", "lowest", "most", "least", "percentage", "monthly",
-        "daily", "yearly", "over time", "fluctuate", "merchant", "category",
-        "transaction", "amount", "which", "top", "statistics",
-    ]
-    rag_keywords = [
-        "what are", "explain", "describe", "methods", "components",
-        "according to", "authors", "definition", "how does", "why",
-        "primary methods", "core components", "detection system",
-        "techniques", "strategies",
-    ]
-    hybrid_keywords = [
-        "eea", "cross-border", "h1 2023", "report", "compared to",
-        "outside the", "share of total",
-    ]
+    sql_score = len(_SQL_RE.findall(q))
+    rag_score = len(_RAG_RE.findall(q))
+    hybrid_score = len(_HYBRID_RE.findall(q))
+    return sql_score, rag_score, hybrid_score
+
 
-    sql_score = sum(1 for kw in sql_keywords if kw in q)
-    rag_score = sum(1 for kw in rag_keywords if kw in q)
-    hybrid_score = sum(1 for kw in hybrid_keywords if kw in q)
+def _keyword_classification(
+    question: str,
+    scores: tuple[int, int, int],
+    reasoning: str,
+) -> ClassificationResult:
+    sql_score, rag_score, hybrid_score = scores
 
     if hybrid_score > 0:
         qt = QueryType.HYBRID
@@ -100,7 +146,7 @@ def _fallback_classification(question: str) -> ClassificationResult:
 
     return ClassificationResult(
         query_type=qt,
-        reasoning="Fallback keyword-based classification",
+        reasoning=reasoning,
         sql_query_hint=question if qt in [QueryType.SQL, QueryType.HYBRID] else None,
         rag_search_hint=question if qt in [QueryType.RAG, QueryType.HYBRID] else None,
     )
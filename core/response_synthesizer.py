@@ -24,6 +24,9 @@ RULES:
 Answer the following question thoroughly and accurately:
 """
 
+# Split once so each request only concatenates strings instead of re-parsing the template
+_PROMPT_PREFIX, _PROMPT_SUFFIX = SYNTHESIS_PROMPT.split("{context_section}")
+
 
 def synthesize_response(
     question: str,
@@ -45,10 +48,30 @@ def build_synthesis_messages(
     rag_result: RAGResult | None = None,
     history: list[dict] | None = None,
 ) -> list[dict] | None:
+    context_parts = _build_context_parts(sql_result, rag_result)
+    if not context_parts:
+        return None
+
+    context_section = "\n\n".join(context_parts)
+    messages = [
+        {
+            "role": "system",
+            "content": _PROMPT_PREFIX + "CONTEXT:\n" + context_section + _PROMPT_SUFFIX,
+        },
+    ]
+    # Include recent conversation history so the model can reference prior answers
+    if history:
+        for msg in history[-6:]:  # last 3 exchanges
+            messages.append({"role": msg["role"], "content": msg["content"]})
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def _build_context_parts(sql_result: SQLResult | None, rag_result: RAGResult | None) -> list[str]:
     context_parts = []
 
     if sql_result and not sql_result.error and sql_result.rows:
-        table_text = format_sql_result_as_text(sql_result.columns, sql_result.rows)
+        table_text = _sql_text(sql_result)
         context_parts.append(
             f"## SQL Query Results\n"
             f"Query: {sql_result.query}\n"
@@ -66,22 +89,14 @@ def build_synthesis_messages(
             f"## Document Context\n" + "\n\n---\n\n".join(doc_parts)
         )
 
-    if not context_parts:
-        return None
+    return context_parts
 
-    context_section = "\n\n".join(context_parts)
-    messages = [
-        {
-            "role": "system",
-            "content": SYNTHESIS_PROMPT.format(context_section=f"CONTEXT:\n{context_section}"),
-        },
-    ]
-    # Include recent conversation history so the model can reference prior answers
-    if history:
-        for msg in history[-6:]:  # last 3 exchanges
-            messages.append({"role": msg["role"], "content": msg["content"]})
-    messages.append({"role": "user", "content": question})
-    return messages
+
+def _sql_text(sql_result: SQLResult) -> str:
+    # Formatted once per result, however many prompts are built from it
+    if sql_result._text is None:
+        sql_result._text = format_sql_result_as_text(sql_result.columns, sql_result.rows)
+    return sql_result._text
 
 
 def synthesize_response_stream(
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from dataclasses import dataclass, field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Optional
 from models.enums import QueryType
 
@@ -7,15 +8,18 @@ class ClassificationResult(BaseModel):
     query_type: QueryType = Field(description="Type of query: sql, rag, or hybrid")
     reasoning: str = Field(description="Brief reasoning for the classification")
     sql_query_hint: Optional[str] = Field(default=None, description="Hint for SQL query if applicable")
+    sql_query: Optional[str] = Field(default=None, description="SQL drafted by the classifier, tried before generating one")
     rag_search_hint: Optional[str] = Field(default=None, description="Hint for RAG search if applicable")
 
 
 class SQLResult(BaseModel):
     query: str = Field(description="The SQL query that was executed")
     columns: list[str] = Field(default_factory=list, description="Column names")
-    rows: list[list] = Field(default_factory=list, description="Result rows")
+    rows: list[tuple] = Field(default_factory=list, description="Result rows")
     row_count: int = Field(default=0, description="Number of rows returned")
     error: Optional[str] = Field(default=None, description="Error message if query failed")
+    # Rendered text table, filled on first use by the synthesizer
+    _text: Optional[str] = PrivateAttr(default=None)
 
 
 class RAGResult(BaseModel):
@@ -25,6 +29,22 @@ class RAGResult(BaseModel):
     error: Optional[str] = Field(default=None, description="Error message if retrieval failed")
 
 
+@dataclass
+class Chunks:
+    # Parallel lists: entry i of each field describes chunk i
+    ids: list[str] = field(default_factory=list)
+    texts: list[str] = field(default_factory=list)
+    metadatas: list[dict] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def extend(self, other: "Chunks"):
+        self.ids.extend(other.ids)
+        self.texts.extend(other.texts)
+        self.metadatas.extend(other.metadatas)
+
+
 class QualityScore(BaseModel):
     score: int = Field(ge=1, le=5, description="Quality score from 1 to 5")
     reasoning: str = Field(description="Reasoning for the score")
@@ -41,3 +61,4 @@ class AgentResponse(BaseModel):
     sources: list[str] = Field(default_factory=list, description="Source citations")
     error: Optional[str] = Field(default=None, description="Error message if processing failed")
     retry_count: int = Field(default=0, description="Number of retries performed")
+    is_preliminary: bool = Field(default=False, description="True until quality scoring has completed")
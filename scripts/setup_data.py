@@ -1,4 +1,5 @@
 import sys
+import argparse
 import logging
 from pathlib import Path
 
@@ -26,13 +27,11 @@ def setup_all():
 
     # Step 2: Setup ChromaDB vector store
     logger.info("\n[2/2] Setting up ChromaDB vector store...")
-    from tools.document_processor import process_pdf
-    from services.vector_store import add_documents, validate_vector_store
+    from tools.document_processor import process_pdf_batched
+    from services.vector_store import add_document_batches, validate_vector_store
 
-    chunks = process_pdf()
-    logger.info(f"Processed {len(chunks)} chunks from PDF")
-
-    doc_count = add_documents(chunks)
+    # Chunks are embedded batch by batch while the PDF is still being processed
+    doc_count = add_document_batches(process_pdf_batched())
     logger.info(f"Documents in vector store: {doc_count}")
 
     vs_validation = validate_vector_store()
@@ -50,5 +49,24 @@ def setup_all():
     }
 
 
+def migrate():
+    # Upgrades an existing database in place instead of rebuilding everything
+    from services.database import migrate_database
+
+    if migrate_database():
+        logger.info("Database migrated: trans_month column and indexes added")
+    else:
+        logger.info("Database is already up to date (or missing; run without --migrate)")
+
+
 if __name__ == "__main__":
-    setup_all()
+    parser = argparse.ArgumentParser(description="Build the SQLite database and vector store")
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="Only upgrade an existing database to the current schema",
+    )
+    if parser.parse_args().migrate:
+        migrate()
+    else:
+        setup_all()
@@ -1,6 +1,10 @@
+import re
 import sqlite3
 import logging
 import os
+import threading
+import weakref
+from functools import lru_cache
 import pandas as pd
 from pathlib import Path
 
@@ -10,30 +14,179 @@ DATA_DIR = Path(__file__).parent.parent / "data"
 DB_PATH = DATA_DIR / "fraud_database.db"
 DATASET_DIR = Path(__file__).parent.parent / "dataset"
 
+CSV_CHUNK_ROWS = 100_000
+CSV_BLOCK_SIZE = 32 << 20  # bytes per pyarrow parse block
+PAGE_SIZE = 8192
+MMAP_SIZE = 1 << 30     # 1 GiB
+CACHE_SIZE = 256 << 20  # 256 MiB
 
-def get_connection() -> sqlite3.Connection:
+_local = threading.local()
+
+_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# Column names and SQLite types, in CSV order (see get_table_schema)
+TABLE_COLUMNS = [
+    ("row_index", "INTEGER"),
+    ("trans_date_trans_time", "TEXT"),
+    ("cc_num", "INTEGER"),
+    ("merchant", "TEXT"),
+    ("category", "TEXT"),
+    ("amt", "REAL"),
+    ("first", "TEXT"),
+    ("last", "TEXT"),
+    ("gender", "TEXT"),
+    ("street", "TEXT"),
+    ("city", "TEXT"),
+    ("state", "TEXT"),
+    ("zip", "INTEGER"),
+    ("lat", "REAL"),
+    ("long", "REAL"),
+    ("city_pop", "INTEGER"),
+    ("job", "TEXT"),
+    ("dob", "TEXT"),
+    ("trans_num", "TEXT"),
+    ("unix_time", "INTEGER"),
+    ("merch_lat", "REAL"),
+    ("merch_long", "REAL"),
+    ("is_fraud", "INTEGER"),
+]
+
+# trans_month makes monthly grouping indexable without strftime()
+TRANS_MONTH_COLUMN = "trans_month TEXT GENERATED ALWAYS AS (substr(trans_date_trans_time, 1, 7)) VIRTUAL"
+
+# Composite indexes lead with the usual GROUP BY/filter column and carry
+# is_fraud and amt so common aggregates are answered from the index alone
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_trans_date ON fraud_transactions(trans_date_trans_time)",
+    "CREATE INDEX IF NOT EXISTS idx_month_fraud ON fraud_transactions(trans_month, is_fraud, amt)",
+    "CREATE INDEX IF NOT EXISTS idx_fraud_month_cat ON fraud_transactions(is_fraud, trans_month, category)",
+    "CREATE INDEX IF NOT EXISTS idx_category_fraud ON fraud_transactions(category, is_fraud, amt)",
+    "CREATE INDEX IF NOT EXISTS idx_merchant_amt ON fraud_transactions(merchant, amt, is_fraud)",
+]
+
+
+class _ConnectionHolder:
+    # Lives only in its thread's local storage; collecting it closes the connection
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+def get_readonly_connection() -> sqlite3.Connection:
+    # One long-lived connection per thread, opened read-only at the file level;
+    # callers must not close it
+    holder = getattr(_local, "holder", None)
+    if holder is None:
+        if not DB_PATH.exists():
+            raise RuntimeError("Database not found. Run `python scripts/setup_data.py` first.")
+        conn = _open_connection(readonly=True)
+        if _needs_migration(conn):
+            conn.close()
+            raise RuntimeError(
+                "Database predates the trans_month column. Run `python scripts/setup_data.py --migrate`."
+            )
+        _apply_read_pragmas(conn)
+        holder = _ConnectionHolder(conn)
+        # Thread-local values are dropped when their thread exits, so short-lived
+        # threads (Streamlit reruns, executor workers) don't leave connections open;
+        # anything still open is closed at interpreter exit
+        weakref.finalize(holder, conn.close)
+        _local.holder = holder
+    return holder.conn
+
+
+# Every pooled connection is read-only; the original name is kept for callers
+get_connection = get_readonly_connection
+
+
+def _open_connection(page_size: int | None = None, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        # mode=ro rejects writes outright and skips creating a missing file
+        conn = sqlite3.connect(f"{DB_PATH.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.Connection(str(DB_PATH))
+    conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    if page_size:
+        # Only takes effect when the database file is first created
+        conn.execute(f"PRAGMA page_size={page_size}")
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA busy_timeout=5000")
     return conn
 
 
+def _apply_read_pragmas(conn: sqlite3.Connection):
+    # Analytical scans benefit from memory-mapped reads and a larger page cache.
+    # Both are capped by available RAM since every pooled connection gets its own.
+    available = _available_memory()
+    mmap_size = MMAP_SIZE if available is None else min(MMAP_SIZE, available // 4)
+    cache_bytes = CACHE_SIZE if available is None else min(CACHE_SIZE, available // 8)
+    conn.execute(f"PRAGMA mmap_size={mmap_size}")
+    conn.execute(f"PRAGMA cache_size=-{cache_bytes // 1024}")  # negative = KiB
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+
+def _available_memory() -> int | None:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None  # not available on this platform (e.g. Windows)
+
+
+def _needs_migration(conn: sqlite3.Connection) -> bool:
+    # table_xinfo (unlike table_info) lists generated columns; no table means no data yet
+    columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(fraud_transactions)")}
+    return bool(columns) and "trans_month" not in columns
+
+
+def database_needs_migration() -> bool:
+    if not DB_PATH.exists():
+        return False
+    conn = _open_connection(readonly=True)
+    try:
+        return _needs_migration(conn)
+    finally:
+        conn.close()
+
+
+def migrate_database() -> bool:
+    # Adds trans_month and its indexes to a database built before the column
+    # existed, without reloading the CSVs. Slow on the full table (index builds
+    # and ANALYZE), so it only runs from `setup_data.py --migrate`.
+    if not DB_PATH.exists():
+        return False
+    conn = _open_connection()
+    try:
+        if not _needs_migration(conn):
+            return False
+        logger.info("Adding trans_month column and indexes to existing database...")
+        conn.execute(f"ALTER TABLE fraud_transactions ADD COLUMN {TRANS_MONTH_COLUMN}")
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.execute("ANALYZE")
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
 def is_database_ready() -> bool:
     if not DB_PATH.exists():
         return False
     try:
-        conn = get_connection()
+        conn = get_readonly_connection()
         cursor = conn.execute(
             "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name='fraud_transactions'"
         )
-        exists = cursor.fetchone()[0] > 0
-        conn.close()
-        return exists
+        return cursor.fetchone()[0] > 0
     except Exception:
         return False
 
 
+@lru_cache(maxsize=1)
 def get_table_schema() -> str:
     return """Table: fraud_transactions
 Columns:
@@ -60,52 +213,48 @@ Columns:
   - merch_lat (REAL): Merchant latitude
   - merch_long (REAL): Merchant longitude
   - is_fraud (INTEGER): 1 = fraudulent, 0 = legitimate
+  - trans_month (TEXT): Transaction month as 'YYYY-MM' (indexed, derived from trans_date_trans_time)
 
 Date range: 2019-01-01 to 2020-12-31
-Use strftime() for date grouping. Example: strftime('%Y-%m', trans_date_trans_time)
+Use trans_month for monthly grouping. Use strftime() for other date grouping. Example: strftime('%Y-%m-%d', trans_date_trans_time)
 """
 
 
 def setup_database() -> dict:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    conn = get_connection()
+    # Dedicated writable connection; the pooled ones are read-only
+    conn = _open_connection(page_size=PAGE_SIZE)
 
     train_path = DATASET_DIR / "fraudTrain.csv"
     test_path = DATASET_DIR / "fraudTest.csv"
 
     stats = {"train_rows": 0, "test_rows": 0, "total_rows": 0, "fraud_count": 0}
 
-    logger.info("Loading training data...")
-    df_train = pd.read_csv(str(train_path))
-    df_train.rename(columns={"Unnamed: 0": "row_index"}, inplace=True)
-    if "" in df_train.columns:
-        df_train.rename(columns={"": "row_index"}, inplace=True)
-    stats["train_rows"] = len(df_train)
-
-    logger.info("Loading test data...")
-    df_test = pd.read_csv(str(test_path))
-    df_test.rename(columns={"Unnamed: 0": "row_index"}, inplace=True)
-    if "" in df_test.columns:
-        df_test.rename(columns={"": "row_index"}, inplace=True)
-    stats["test_rows"] = len(df_test)
-
-    df = pd.concat([df_train, df_test], ignore_index=True)
-
-    # Normalize datetime
-    df["trans_date_trans_time"] = pd.to_datetime(df["trans_date_trans_time"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-    df["dob"] = pd.to_datetime(df["dob"]).dt.strftime("%Y-%m-%d")
-
-    logger.info(f"Writing {len(df)} rows to SQLite...")
-    df.to_sql("fraud_transactions", conn, if_exists="replace", index=False)
-
-    # Create indexes for performance
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_trans_date ON fraud_transactions(trans_date_trans_time)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_is_fraud ON fraud_transactions(is_fraud)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_category ON fraud_transactions(category)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_merchant ON fraud_transactions(merchant)")
+    conn.execute("DROP TABLE IF EXISTS fraud_transactions")
+    column_defs = ", ".join(f'"{name}" {col_type}' for name, col_type in TABLE_COLUMNS)
+    conn.execute(f"CREATE TABLE fraud_transactions ({column_defs}, {TRANS_MONTH_COLUMN})")
+    conn.commit()
+
+    # Bulk-load settings; durability is irrelevant until the load completes
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    conn.execute("PRAGMA synchronous=OFF")
+    try:
+        logger.info("Loading training data...")
+        stats["train_rows"] = _load_csv(conn, train_path)
+
+        logger.info("Loading test data...")
+        stats["test_rows"] = _load_csv(conn, test_path)
+        conn.commit()
+    finally:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+
+    # Create indexes for performance (once, after all rows are in)
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.execute("ANALYZE")
     conn.commit()
 
-    stats["total_rows"] = len(df)
+    stats["total_rows"] = stats["train_rows"] + stats["test_rows"]
     cursor = conn.execute("SELECT COUNT(*) FROM fraud_transactions WHERE is_fraud = 1")
     stats["fraud_count"] = cursor.fetchone()[0]
 
@@ -114,40 +263,92 @@ def setup_database() -> dict:
     return stats
 
 
-def execute_query(sql: str, timeout: int = 10) -> tuple[list[str], list[list]]:
-    conn = get_connection()
+def _load_csv(conn: sqlite3.Connection, path: Path) -> int:
+    # Stream the CSV in chunks so peak memory stays at one chunk
+    rows = 0
+    for chunk in _iter_csv_chunks(path):
+        chunk.rename(columns={"Unnamed: 0": "row_index", "": "row_index"}, inplace=True)
+
+        # Normalize datetime
+        chunk["trans_date_trans_time"] = _normalize_dates(chunk["trans_date_trans_time"], "%Y-%m-%d %H:%M:%S", _DATETIME_RE)
+        chunk["dob"] = _normalize_dates(chunk["dob"], "%Y-%m-%d", _DATE_RE)
+
+        # Bind rows straight into a prepared INSERT; all chunks share one transaction
+        columns = ", ".join(f'"{c}"' for c in chunk.columns)
+        placeholders = ", ".join("?" * len(chunk.columns))
+        conn.executemany(
+            f"INSERT INTO fraud_transactions ({columns}) VALUES ({placeholders})",
+            chunk.itertuples(index=False, name=None),
+        )
+        rows += len(chunk)
+        logger.info(f"  {path.name}: {rows} rows written")
+    return rows
+
+
+def _iter_csv_chunks(path: Path):
+    # pyarrow parses each block on multiple threads; pandas' C parser is the fallback
     try:
-        conn.execute(f"PRAGMA busy_timeout={timeout * 1000}")
-        cursor = conn.execute(sql)
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-        rows = [list(row) for row in cursor.fetchall()]
-        return columns, rows
-    finally:
-        conn.close()
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        yield from pd.read_csv(str(path), chunksize=CSV_CHUNK_ROWS)
+        return
+
+    reader = pacsv.open_csv(
+        str(path),
+        read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        # Dates stay text, matching the TEXT columns they are stored in
+        convert_options=pacsv.ConvertOptions(
+            column_types={"trans_date_trans_time": pa.string(), "dob": pa.string()},
+        ),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def _normalize_dates(values: pd.Series, fmt: str, canonical: re.Pattern) -> pd.Series:
+    # The Kaggle CSVs already use the canonical text form, so parsing and
+    # re-formatting would be a no-op round trip; only convert when needed.
+    if values.astype(str).str.fullmatch(canonical).all():
+        return values
+    return pd.to_datetime(values, cache=True).dt.strftime(fmt)
+
+
+def execute_query(sql: str, timeout: int = 10, max_rows: int | None = None) -> tuple[list[str], list[tuple]]:
+    conn = get_readonly_connection()
+    conn.execute(f"PRAGMA busy_timeout={timeout * 1000}")
+    cursor = conn.execute(sql)
+    columns = [desc[0] for desc in cursor.description] if cursor.description else []
+    # Rows stay as the tuples sqlite3 returns; no per-row list copy
+    if max_rows is None:
+        rows = cursor.fetchall()
+    else:
+        # SQLite only produces rows as they are pulled, so closing the cursor
+        # stops an unbounded SELECT once max_rows have been read
+        rows = cursor.fetchmany(max_rows)
+        cursor.close()
+    return columns, rows
 
 
 def validate_database() -> dict:
-    conn = get_connection()
-    try:
-        cursor = conn.execute("SELECT COUNT(*) FROM fraud_transactions")
-        total = cursor.fetchone()[0]
-
-        cursor = conn.execute("SELECT COUNT(*) FROM fraud_transactions WHERE is_fraud = 1")
-        fraud = cursor.fetchone()[0]
-
-        cursor = conn.execute("SELECT MIN(trans_date_trans_time), MAX(trans_date_trans_time) FROM fraud_transactions")
-        date_range = cursor.fetchone()
-
-        cursor = conn.execute("SELECT DISTINCT category FROM fraud_transactions ORDER BY category")
-        categories = [row[0] for row in cursor.fetchall()]
-
-        return {
-            "total_rows": total,
-            "fraud_count": fraud,
-            "legitimate_count": total - fraud,
-            "fraud_rate": round(fraud / total * 100, 2) if total > 0 else 0,
-            "date_range": {"min": date_range[0], "max": date_range[1]},
-            "categories": categories,
-        }
-    finally:
-        conn.close()
+    conn = get_readonly_connection()
+    cursor = conn.execute("SELECT COUNT(*) FROM fraud_transactions")
+    total = cursor.fetchone()[0]
+
+    cursor = conn.execute("SELECT COUNT(*) FROM fraud_transactions WHERE is_fraud = 1")
+    fraud = cursor.fetchone()[0]
+
+    cursor = conn.execute("SELECT MIN(trans_date_trans_time), MAX(trans_date_trans_time) FROM fraud_transactions")
+    date_range = cursor.fetchone()
+
+    cursor = conn.execute("SELECT DISTINCT category FROM fraud_transactions ORDER BY category")
+    categories = [row[0] for row in cursor.fetchall()]
+
+    return {
+        "total_rows": total,
+        "fraud_count": fraud,
+        "legitimate_count": total - fraud,
+        "fraud_rate": round(fraud / total * 100, 2) if total > 0 else 0,
+        "date_range": {"min": date_range[0], "max": date_range[1]},
+        "categories": categories,
+    }
@@ -0,0 +1,189 @@
+import logging
+import pickle
+import threading
+from pathlib import Path
+import numpy as np
+from services.together_ai import get_embeddings, get_embeddings_parallel
+from services.local_embeddings import get_local_embedder
+from models.schemas import Chunks
+from utils.helpers import get_faiss_quantization, normalize_embeddings
+
+try:
+    import simsimd  # optional SIMD kernels for the exact rerank
+except ImportError:
+    simsimd = None
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+FAISS_DIR = DATA_DIR / "faiss_store"
+
+# HNSW graph parameters
+HNSW_M = 32
+EF_CONSTRUCTION = 200
+EF_SEARCH = 64
+
+# Product quantization: 8-bit codes, so each sub-quantizer learns 256 centroids
+PQ_NBITS = 8
+PQ_MIN_TRAIN = 1 << PQ_NBITS
+
+# int8 and pq indexes over-fetch this many times n_results, then rerank exactly;
+# fp16 keeps enough precision that its ranking is used as is
+RERANK_FACTOR = 4
+
+_index = None
+_documents: list[str] = []
+_metadatas: list[dict] = []
+_vectors: np.ndarray | None = None  # float32 copies, kept only for int8/pq indexes
+_lock = threading.Lock()
+
+
+def _store_dir() -> Path:
+    # Local and Together embeddings differ in dimensionality, so each gets its own index
+    return FAISS_DIR / ("local" if get_local_embedder() is not None else "together")
+
+
+def _load():
+    # Lazily read the index and its row-aligned documents/metadata from disk
+    global _index, _documents, _metadatas, _vectors
+    if _index is not None:
+        return _index
+    with _lock:
+        store_dir = _store_dir()
+        index_path = store_dir / "index.faiss"
+        docs_path = store_dir / "documents.pkl"
+        if _index is None and index_path.exists() and docs_path.exists():
+            import faiss
+
+            with open(docs_path, "rb") as f:
+                _documents, _metadatas = pickle.load(f)
+            index = faiss.read_index(str(index_path))
+            vectors_path = store_dir / "vectors.npy"
+            # Memory-mapped, so only the rows being reranked are paged in
+            if _needs_rerank(faiss, index) and vectors_path.exists():
+                _vectors = np.load(vectors_path, mmap_mode="r")
+            else:
+                _vectors = None
+            index.hnsw.efSearch = EF_SEARCH
+            _index = index
+    return _index
+
+
+def count() -> int:
+    index = _load()
+    return index.ntotal if index is not None else 0
+
+
+def add_documents(chunks: Chunks) -> int:
+    global _index, _documents, _metadatas, _vectors
+    current = count()
+    if current > 0:
+        logger.info(f"FAISS index already has {current} documents, skipping ingestion")
+        return current
+
+    import faiss
+
+    # Row i of the index is chunk i; ids are implied by position
+    documents = chunks.texts
+    metadatas = chunks.metadatas
+
+    logger.info(f"Computing embeddings for {len(documents)} chunks...")
+    vectors = normalize_embeddings(get_embeddings_parallel(documents))
+    logger.info(f"Computed {len(vectors)} embeddings")
+
+    index = _new_index(faiss, vectors.shape[1], len(vectors))
+    index.hnsw.efConstruction = EF_CONSTRUCTION
+    # Quantizers learn ranges or codebooks first; a no-op for flat storage
+    index.train(vectors)
+    index.add(vectors)
+    index.hnsw.efSearch = EF_SEARCH
+
+    store_dir = _store_dir()
+    store_dir.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(index, str(store_dir / "index.faiss"))
+    with open(store_dir / "documents.pkl", "wb") as f:
+        pickle.dump((documents, metadatas), f)
+    exact = None
+    vectors_path = store_dir / "vectors.npy"
+    if _needs_rerank(faiss, index):
+        np.save(vectors_path, vectors)
+        exact = vectors
+    else:
+        vectors_path.unlink(missing_ok=True)
+
+    with _lock:
+        _index, _documents, _metadatas, _vectors = index, documents, metadatas, exact
+    logger.info(f"Total documents in FAISS index: {index.ntotal}")
+    return index.ntotal
+
+
+def _new_index(faiss, dim: int, n_vectors: int):
+    # Inner product on unit vectors is cosine similarity. fp16 halves and int8
+    # quarters vector memory with negligible recall loss on text embeddings;
+    # pq stores one byte per sub-vector (e.g. 768 floats -> 64 bytes).
+    quantization = get_faiss_quantization()
+    if quantization == "pq":
+        pq_m = next((m for m in (64, 48, 32, 16, 8) if dim % m == 0), None)
+        if pq_m is not None and n_vectors >= PQ_MIN_TRAIN:
+            return faiss.IndexHNSWPQ(dim, pq_m, HNSW_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        # Too few chunks to train 256 centroids per sub-quantizer
+        logger.warning(f"PQ needs at least {PQ_MIN_TRAIN} vectors with a suitable dimension; using fp16")
+        quantization = "fp16"
+    qtypes = {
+        "fp16": faiss.ScalarQuantizer.QT_fp16,
+        "int8": faiss.ScalarQuantizer.QT_8bit,
+    }
+    if quantization in qtypes:
+        return faiss.IndexHNSWSQ(dim, qtypes[quantization], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    if quantization != "none":
+        logger.warning(f"Unknown FAISS_QUANTIZATION '{quantization}'; storing float32 vectors")
+    return faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+
+
+def _needs_rerank(faiss, index) -> bool:
+    # int8 and pq codes lose enough precision to reorder close hits; fp16 and flat don't
+    if isinstance(index, faiss.IndexHNSWPQ):
+        return True
+    if isinstance(index, faiss.IndexHNSWSQ):
+        return faiss.downcast_index(index.storage).sq.qtype == faiss.ScalarQuantizer.QT_8bit
+    return False
+
+
+def search_documents(query: str, n_results: int = 7) -> dict:
+    return search_documents_batch([query], n_results=n_results)[0]
+
+
+def search_documents_batch(queries: list[str], n_results: int = 7) -> list[dict]:
+    index = _load()
+    if index is None or index.ntotal == 0:
+        return [{"documents": [], "metadatas": [], "distances": []} for _ in queries]
+
+    # One embedding call and one index.search over the whole (N, d) query matrix
+    query_vecs = normalize_embeddings(get_embeddings(queries))
+    k = min(n_results * RERANK_FACTOR if _vectors is not None else n_results, index.ntotal)
+    all_scores, all_rows = index.search(query_vecs, k)
+
+    results = []
+    for query_vec, scores, rows in zip(query_vecs, all_scores, all_rows):
+        hits = [(row, score) for row, score in zip(rows, scores) if row >= 0]
+        if _vectors is not None and hits:
+            hits = _rerank(query_vec, [row for row, _ in hits])[:n_results]
+        results.append({
+            "documents": [_documents[row] for row, _ in hits],
+            "metadatas": [_metadatas[row] for row, _ in hits],
+            # Reported as cosine distance to match the Chroma collection
+            "distances": [float(1.0 - score) for _, score in hits],
+        })
+    return results
+
+
+def _rerank(query_vec: np.ndarray, rows: list[int]) -> list[tuple[int, float]]:
+    # Quantized scores are approximate; re-score the candidates against the
+    # stored float32 vectors and re-sort by exact cosine similarity
+    candidates = np.ascontiguousarray(_vectors[rows], dtype=np.float32)
+    if simsimd is not None:
+        sims = 1.0 - np.asarray(simsimd.cdist(query_vec[None, :], candidates, metric="cos"))[0]
+    else:
+        sims = candidates @ query_vec
+    order = np.argsort(-sims)
+    return [(rows[i], float(sims[i])) for i in order]
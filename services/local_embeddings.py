@@ -0,0 +1,67 @@
+import logging
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from utils.helpers import get_embedding_backend, get_local_embedding_dir
+
+logger = logging.getLogger(__name__)
+
+# all-MiniLM-L6-v2 was trained on sequences of at most 256 tokens
+MAX_SEQ_LEN = 256
+BATCH_SIZE = 64
+
+
+class LocalEmbedder:
+    # ONNX export of a sentence-transformers model plus its tokenizer.json
+    def __init__(self, model_dir: Path):
+        # Optional dependencies, only needed when EMBEDDING_BACKEND=local
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.name = f"local:{model_dir.name}"
+        self.session = ort.InferenceSession(
+            str(model_dir / "model.onnx"),
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LEN)
+        self.tokenizer.enable_padding()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        all_embeddings = []
+        for i in range(0, len(texts), BATCH_SIZE):
+            all_embeddings.append(self._embed_batch(texts[i:i + BATCH_SIZE]))
+        if not all_embeddings:
+            return []
+        return np.concatenate(all_embeddings).tolist()
+
+    def _embed_batch(self, batch: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(batch)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real tokens, then L2 normalization (as sentence-transformers does)
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+@lru_cache(maxsize=1)
+def get_local_embedder() -> LocalEmbedder | None:
+    # Resolved once per process; None means the Together API should be used
+    if get_embedding_backend() != "local":
+        return None
+    model_dir = get_local_embedding_dir()
+    try:
+        embedder = LocalEmbedder(model_dir)
+    except Exception as e:
+        logger.warning(f"Local embedding model unavailable ({e}); falling back to Together AI")
+        return None
+    logger.info(f"Using local ONNX embeddings from {model_dir}")
+    return embedder
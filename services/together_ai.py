@@ -1,7 +1,12 @@
 import logging
-from collections.abc import Generator
-from openai import OpenAI
+import time
+from collections.abc import Callable, Generator
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from openai import OpenAI, RateLimitError
 from utils.helpers import get_together_api_key, get_primary_model, get_routing_model, get_embedding_model
+from utils.embed_cache import get_cached_embeddings, put_cached_embeddings
+from services.local_embeddings import get_local_embedder
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +19,26 @@ def get_client() -> OpenAI:
         _client = OpenAI(
             api_key=get_together_api_key(),
             base_url="https://api.together.xyz/v1",
+            http_client=_build_http_client(),
         )
     return _client
 
 
+def _build_http_client() -> httpx.Client:
+    # HTTP/2 multiplexes the parallel tool, embedding and scoring calls over one
+    # connection and frames streamed tokens more cheaply; needs the h2 package
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    return httpx.Client(
+        http2=http2,
+        timeout=httpx.Timeout(600.0, connect=10.0),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+    )
+
+
 def chat_completion(
     messages: list[dict],
     model: str | None = None,
@@ -50,9 +71,14 @@ def chat_completion_stream(
         max_tokens=max_tokens,
         stream=True,
     )
+    # Hot path: one attribute chain per chunk, no repeated lookups
     for chunk in stream:
-        if chunk.choices and chunk.choices[0].delta.content:
-            yield chunk.choices[0].delta.content
+        choices = chunk.choices
+        if not choices:
+            continue
+        content = choices[0].delta.content
+        if content:
+            yield content
 
 
 def chat_completion_routing(
@@ -68,17 +94,104 @@ def chat_completion_routing(
     )
 
 
-def get_embeddings(texts: list[str], max_chars_per_text: int = 400) -> list[list[float]]:
-    client = get_client()
-    model = get_embedding_model()
+def get_embeddings(
+    texts: list[str],
+    max_chars_per_text: int = 400,
+    max_chars_per_batch: int = 8000,
+    max_batch_size: int = 128,
+) -> list[list[float]]:
     # Truncate texts to stay within token limits
     truncated = [t[:max_chars_per_text] for t in texts]
-    all_embeddings = []
-    # Send each text individually to avoid exceeding total token limit
-    for t in truncated:
-        response = client.embeddings.create(
-            model=model,
-            input=[t],
-        )
-        all_embeddings.append(response.data[0].embedding)
-    return all_embeddings
+
+    local = get_local_embedder()
+    if local is not None:
+        return _embed_with_cache(truncated, local.embed, model=local.name)
+
+    def embed(misses: list[str]) -> list[list[float]]:
+        all_embeddings = []
+        # Send texts in batches, packing each up to a character budget
+        for batch in _pack_batches(misses, max_chars_per_batch, max_batch_size):
+            all_embeddings.extend(_embed_batch(batch))
+        return all_embeddings
+
+    return _embed_with_cache(truncated, embed)
+
+
+def get_embeddings_parallel(
+    texts: list[str],
+    max_workers: int = 8,
+    max_chars_per_text: int = 400,
+    max_chars_per_batch: int = 8000,
+    max_batch_size: int = 128,
+) -> list[list[float]]:
+    # Same batching as get_embeddings, with several requests in flight at once
+    truncated = [t[:max_chars_per_text] for t in texts]
+
+    local = get_local_embedder()
+    if local is not None:
+        # No network round trips to overlap; ONNX Runtime already uses all cores
+        return _embed_with_cache(truncated, local.embed, model=local.name)
+
+    def embed(misses: list[str]) -> list[list[float]]:
+        batches = _pack_batches(misses, max_chars_per_batch, max_batch_size)
+        if len(batches) <= 1:
+            return [e for batch in batches for e in _embed_batch(batch)]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            # map() preserves batch order, so embeddings line up with the input texts
+            results = list(executor.map(_embed_batch, batches))
+        return [e for batch_embeddings in results for e in batch_embeddings]
+
+    return _embed_with_cache(truncated, embed)
+
+
+def _embed_with_cache(
+    texts: list[str],
+    embed: Callable[[list[str]], list[list[float]]],
+    model: str | None = None,
+) -> list[list[float]]:
+    # Only texts missing from the on-disk cache are sent to the API
+    model = model or get_embedding_model()
+    embeddings = get_cached_embeddings(model, texts)
+    miss_idx = [i for i, e in enumerate(embeddings) if e is None]
+    if miss_idx:
+        misses = [texts[i] for i in miss_idx]
+        new_embeddings = embed(misses)
+        put_cached_embeddings(model, misses, new_embeddings)
+        for i, e in zip(miss_idx, new_embeddings):
+            embeddings[i] = e
+    logger.info(f"Embeddings: {len(texts) - len(miss_idx)} cached, {len(miss_idx)} computed")
+    return embeddings
+
+
+def _embed_batch(batch: list[str], max_retries: int = 5) -> list[list[float]]:
+    client = get_client()
+    model = get_embedding_model()
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.embeddings.create(
+                model=model,
+                input=batch,
+            )
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        except RateLimitError:
+            if attempt == max_retries:
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"Embedding request rate-limited, retrying in {delay}s")
+            time.sleep(delay)
+
+
+def _pack_batches(texts: list[str], max_chars: int, max_size: int) -> list[list[str]]:
+    batches = []
+    batch = []
+    batch_chars = 0
+    for t in texts:
+        if batch and (batch_chars + len(t) > max_chars or len(batch) >= max_size):
+            batches.append(batch)
+            batch = []
+            batch_chars = 0
+        batch.append(t)
+        batch_chars += len(t)
+    if batch:
+        batches.append(batch)
+    return batches
@@ -1,13 +1,27 @@
 import logging
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import chromadb
-from services.together_ai import get_embeddings
+from services.together_ai import get_embeddings, get_embeddings_parallel
+from services.local_embeddings import get_local_embedder
+from services import faiss_store
+from models.schemas import Chunks
+from utils.helpers import get_vector_backend, normalize_embeddings
 
 logger = logging.getLogger(__name__)
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 VECTOR_STORE_DIR = DATA_DIR / "vector_store"
 
+# Embedding requests kept in flight while later batches are being prepared
+EMBED_WORKERS = 4
+
+# HNSW graph parameters for the Chroma collection
+HNSW_M = 16
+HNSW_CONSTRUCTION_EF = 200
+HNSW_SEARCH_EF = 64
+
 _client = None
 _collection = None
 
@@ -24,27 +38,44 @@ def get_collection() -> chromadb.Collection:
     global _collection
     if _collection is None:
         client = get_chroma_client()
+        # Local and Together embeddings differ in dimensionality, so each gets its own collection
+        name = "fraud_reports_local" if get_local_embedder() is not None else "fraud_reports"
         _collection = client.get_or_create_collection(
-            name="fraud_reports",
-            metadata={"hnsw:space": "cosine"},
+            name=name,
+            # Vectors are normalized before insert and query, so inner product
+            # ranks like cosine without Chroma re-normalizing each comparison
+            metadata={
+                "hnsw:space": "ip",
+                "hnsw:M": HNSW_M,
+                "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+                "hnsw:search_ef": HNSW_SEARCH_EF,
+            },
         )
     return _collection
 
 
-def add_documents(chunks: list[dict]) -> int:
+def _use_faiss() -> bool:
+    return get_vector_backend() == "faiss"
+
+
+def add_documents(chunks: Chunks) -> int:
+    if _use_faiss():
+        return faiss_store.add_documents(chunks)
+
     collection = get_collection()
 
-    if collection.count() > 0:
-        logger.info(f"Collection already has {collection.count()} documents, skipping ingestion")
-        return collection.count()
+    current = collection.count()
+    if current > 0:
+        logger.info(f"Collection already has {current} documents, skipping ingestion")
+        return current
 
-    ids = [chunk["id"] for chunk in chunks]
-    documents = [chunk["text"] for chunk in chunks]
-    metadatas = [chunk["metadata"] for chunk in chunks]
+    ids = chunks.ids
+    documents = chunks.texts
+    metadatas = chunks.metadatas
 
     # Pre-compute embeddings with Together AI
     logger.info(f"Computing embeddings for {len(documents)} chunks...")
-    embeddings = get_embeddings(documents)
+    embeddings = normalize_embeddings(get_embeddings_parallel(documents))
     logger.info(f"Computed {len(embeddings)} embeddings")
 
     # Add in batches with pre-computed embeddings
@@ -59,32 +90,87 @@ def add_documents(chunks: list[dict]) -> int:
         )
         logger.info(f"Added batch {i // batch_size + 1}: chunks {i} to {end - 1}")
 
-    logger.info(f"Total documents in collection: {collection.count()}")
-    return collection.count()
+    final = collection.count()
+    logger.info(f"Total documents in collection: {final}")
+    return final
+
+
+def add_document_batches(batches: Iterable[Chunks]) -> int:
+    if _use_faiss():
+        # The FAISS index is built in one pass over all vectors
+        chunks = Chunks()
+        for batch in batches:
+            chunks.extend(batch)
+        return faiss_store.add_documents(chunks)
+
+    collection = get_collection()
+
+    current = collection.count()
+    if current > 0:
+        logger.info(f"Collection already has {current} documents, skipping ingestion")
+        return current
+
+    # Each batch is submitted as soon as it is produced, so embedding overlaps
+    # with reading and chunking the rest of the PDF; results are added in order
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+        pending = [
+            (batch, executor.submit(_embed_batch, batch.texts))
+            for batch in batches
+        ]
+        for n, (batch, future) in enumerate(pending, 1):
+            collection.add(
+                ids=batch.ids,
+                documents=batch.texts,
+                metadatas=batch.metadatas,
+                embeddings=future.result(),
+            )
+            logger.info(f"Added batch {n}: {len(batch)} chunks")
+
+    final = collection.count()
+    logger.info(f"Total documents in collection: {final}")
+    return final
+
+
+def _embed_batch(texts: list[str]):
+    return normalize_embeddings(get_embeddings(texts))
 
 
 def search_documents(query: str, n_results: int = 7) -> dict:
+    return search_documents_batch([query], n_results=n_results)[0]
+
+
+def search_documents_batch(queries: list[str], n_results: int = 7) -> list[dict]:
+    # All queries share one embedding request and one collection query
+    if _use_faiss():
+        return faiss_store.search_documents_batch(queries, n_results=n_results)
+
     collection = get_collection()
-    if collection.count() == 0:
-        return {"documents": [], "metadatas": [], "distances": []}
+    count = collection.count()
+    if count == 0:
+        return [{"documents": [], "metadatas": [], "distances": []} for _ in queries]
 
-    # Pre-compute query embedding
-    query_embedding = get_embeddings([query])[0]
+    # Pre-compute query embeddings
+    query_embeddings = normalize_embeddings(get_embeddings(queries))
 
     results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=min(n_results, collection.count()),
+        query_embeddings=query_embeddings,
+        n_results=min(n_results, count),
     )
 
-    return {
-        "documents": results["documents"][0] if results["documents"] else [],
-        "metadatas": results["metadatas"][0] if results["metadatas"] else [],
-        "distances": results["distances"][0] if results["distances"] else [],
-    }
+    return [
+        {
+            "documents": results["documents"][i] if results["documents"] else [],
+            "metadatas": results["metadatas"][i] if results["metadatas"] else [],
+            "distances": results["distances"][i] if results["distances"] else [],
+        }
+        for i in range(len(queries))
+    ]
 
 
 def is_vector_store_ready() -> bool:
     try:
+        if _use_faiss():
+            return faiss_store.count() > 0
         collection = get_collection()
         return collection.count() > 0
     except Exception:
@@ -92,8 +178,7 @@ def is_vector_store_ready() -> bool:
 
 
 def validate_vector_store() -> dict:
-    collection = get_collection()
-    count = collection.count()
+    count = faiss_store.count() if _use_faiss() else get_collection().count()
 
     test_results = None
     if count > 0:
@@ -0,0 +1,67 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def pytest_addoption(parser):
+    parser.addoption("--quick", action="store_true", help="Run only quick unit tests (no LLM calls)")
+    parser.addoption("--full", action="store_true", help="Run all tests including e2e")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "network: calls the Together AI API")
+    config.addinivalue_line("markers", "e2e: runs a sample question through the whole pipeline")
+
+
+def pytest_collection_modifyitems(config, items):
+    quick = config.getoption("--quick")
+    full = config.getoption("--full")
+    for item in items:
+        if quick and "network" in item.keywords:
+            item.add_marker(pytest.mark.skip(reason="--quick skips tests that call the API"))
+        elif not full and "e2e" in item.keywords:
+            item.add_marker(pytest.mark.skip(reason="use --full to run the sample questions"))
+
+
+@pytest.fixture(scope="session")
+def database_ready():
+    from services.database import is_database_ready
+
+    if not is_database_ready():
+        pytest.fail("Database not ready. Run `python scripts/setup_data.py` first.")
+
+
+@pytest.fixture(scope="session")
+def vector_store_ready():
+    # Opens the store once per worker; every later search reuses it
+    from services.vector_store import is_vector_store_ready
+
+    if not is_vector_store_ready():
+        pytest.fail("Vector store not ready. Run `python scripts/setup_data.py` first.")
+
+
+@pytest.fixture(scope="session")
+def warm_rag_cache(vector_store_ready):
+    # Retrieve every sample question in one batch so per-question searches hit the cache
+    from tools.rag_tool import search_docs_batch
+    from tests.test_backend import SAMPLE_QUESTIONS
+
+    search_docs_batch(SAMPLE_QUESTIONS)
+
+
+@pytest.fixture(scope="session")
+def e2e_responses(database_ready, warm_rag_cache):
+    # Under xdist the questions are already spread across workers, so each test
+    # runs its own; otherwise all of them are answered concurrently up front
+    if os.getenv("PYTEST_XDIST_WORKER"):
+        return {}
+
+    from core.agent import process_query
+    from tests.test_backend import SAMPLE_QUESTIONS
+
+    with ThreadPoolExecutor(max_workers=len(SAMPLE_QUESTIONS)) as executor:
+        return dict(zip(SAMPLE_QUESTIONS, executor.map(process_query, SAMPLE_QUESTIONS)))
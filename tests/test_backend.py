@@ -3,16 +3,18 @@ Backend integration tests for the Fraud Analysis Agent.
 Tests each component individually and then end-to-end with all 6 sample questions.
 """
 import sys
-import os
 import logging
 from pathlib import Path
+import pytest
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
+from models.enums import QueryType
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 
-def test_database():
+def test_database(database_ready):
     logger.info("=" * 50)
     logger.info("TEST: Database Service")
     logger.info("=" * 50)
@@ -37,7 +39,8 @@ def test_database():
     logger.info("  PASSED: Database service works correctly\n")
 
 
-def test_vector_store():
+@pytest.mark.network
+def test_vector_store(vector_store_ready):
     logger.info("=" * 50)
     logger.info("TEST: Vector Store Service")
     logger.info("=" * 50)
@@ -60,7 +63,8 @@ def test_vector_store():
     logger.info("  PASSED: Vector store works correctly\n")
 
 
-def test_sql_tool():
+@pytest.mark.network
+def test_sql_tool(database_ready):
     logger.info("=" * 50)
     logger.info("TEST: SQL Tool")
     logger.info("=" * 50)
@@ -98,11 +102,165 @@ def test_sql_safety():
     logger.info("  PASSED: SQL safety checks work correctly\n")
 
 
-def test_rag_tool():
+def test_clean_sql():
+    logger.info("=" * 50)
+    logger.info("TEST: SQL Cleanup")
+    logger.info("=" * 50)
+    from tools.sql_tool import clean_sql
+
+    assert clean_sql("SELECT 1") == "SELECT 1;"
+    assert clean_sql("  SELECT 1;  ") == "SELECT 1;"
+    assert clean_sql("```sql\nSELECT a\nFROM t;\n```") == "SELECT a\nFROM t;"
+    assert clean_sql("```\nSELECT 1\n```\n") == "SELECT 1;"
+    # SQL on the opening fence line must be kept
+    assert clean_sql("```SELECT a\nFROM t```") == "SELECT a\nFROM t;"
+    assert clean_sql("```sql SELECT 1```") == "SELECT 1;"
+    # Language tag only, and a closing fence without an opening one
+    assert clean_sql("```sql\n```") == ";"
+    assert clean_sql("SELECT 1\n```") == "SELECT 1;"
+    logger.info("  PASSED: SQL cleanup works correctly\n")
+
+
+def test_validate_sql_cache(monkeypatch):
+    logger.info("=" * 50)
+    logger.info("TEST: SQL Validation Cache")
+    logger.info("=" * 50)
+    import sqlite3
+    from tools import sql_tool
+
+    conn = sqlite3.connect(":memory:")
+    monkeypatch.setattr(sql_tool, "get_readonly_connection", lambda: conn)
+    monkeypatch.setattr(sql_tool, "_validation_cache", {})
+
+    # A missing table depends on the database state: reported, not cached
+    is_valid, msg = sql_tool.validate_sql("SELECT a FROM t;")
+    assert not is_valid and "no such table" in msg
+    assert "SELECT a FROM t;" not in sql_tool._validation_cache
+    conn.execute("CREATE TABLE t (a INTEGER)")
+    assert sql_tool.validate_sql("SELECT a FROM t;") == (True, "Valid")
+    assert sql_tool._validation_cache["SELECT a FROM t;"] == (True, "Valid")
+
+    # Syntax errors depend only on the SQL text, so they are cached
+    is_valid, msg = sql_tool.validate_sql("SELECT a FROM t WHERE;")
+    assert not is_valid and msg.startswith("SQL syntax error")
+    assert "SELECT a FROM t WHERE;" in sql_tool._validation_cache
+
+    # Connection and lock failures are never cached
+    def unavailable():
+        raise RuntimeError("Database not found. Run `python scripts/setup_data.py` first.")
+
+    class LockedConnection:
+        def execute(self, sql):
+            raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(sql_tool, "get_readonly_connection", unavailable)
+    is_valid, msg = sql_tool.validate_sql("SELECT 1;")
+    assert not is_valid and msg.startswith("Validation error")
+    monkeypatch.setattr(sql_tool, "get_readonly_connection", LockedConnection)
+    is_valid, msg = sql_tool.validate_sql("SELECT 2;")
+    assert not is_valid and msg.startswith("Validation error")
+    assert "SELECT 1;" not in sql_tool._validation_cache
+    assert "SELECT 2;" not in sql_tool._validation_cache
+    logger.info("  PASSED: SQL validation cache works correctly\n")
+
+
+def test_batch_tokens(monkeypatch):
+    logger.info("=" * 50)
+    logger.info("TEST: Token Batching")
+    logger.info("=" * 50)
+    from core import agent
+
+    # Size threshold only: grows 1, 3, 9, 27, then caps at BATCH_CHARS (32)
+    monkeypatch.setattr(agent, "BATCH_MS", 10**9)
+    batches = list(agent._batch_tokens(["a"] * 100))
+    assert [len(b) for b in batches] == [1, 3, 9, 27, 32, 28], "Unexpected batch sizes"
+    assert "".join(batches) == "a" * 100, "Tokens lost or reordered"
+
+    # The final partial batch is flushed when the stream ends
+    assert list(agent._batch_tokens(["a"] * 6)) == ["a", "aaa", "aa"]
+    assert list(agent._batch_tokens([])) == []
+
+    # Once BATCH_MS has elapsed every token is flushed on arrival
+    monkeypatch.setattr(agent, "BATCH_MS", 0)
+    assert list(agent._batch_tokens(["ab", "c", "de"])) == ["ab", "c", "de"]
+    logger.info("  PASSED: Token batching works correctly\n")
+
+
+def test_keyword_patterns():
+    logger.info("=" * 50)
+    logger.info("TEST: Classifier Keyword Patterns")
+    logger.info("=" * 50)
+    from core.query_classifier import _compile_keywords, _score_keywords
+
+    # Longest phrase wins, so an overlapping shorter keyword is not counted again
+    pattern = _compile_keywords(["methods", "primary methods", "components", "core components"])
+    assert pattern.findall("what are the primary methods and core components?") == ["primary methods", "core components"]
+    assert pattern.findall("other methods") == ["methods"]
+
+    # Anchored at the start only: plurals match, words merely containing a keyword don't
+    assert _compile_keywords(["rate"]).findall("fraud rates") == ["rate"]
+    assert _compile_keywords(["rate"]).findall("an accurate answer") == []
+
+    # "primary methods" counts once, not twice with "methods"
+    assert _score_keywords("What are the primary methods by which credit card fraud is committed?") == (1, 2, 0)
+    logger.info("  PASSED: Keyword patterns work correctly\n")
+
+
+def test_chunk_text():
+    logger.info("=" * 50)
+    logger.info("TEST: Text Chunking")
+    logger.info("=" * 50)
+    from tools.document_processor import chunk_text
+
+    assert chunk_text("Short page.") == ["Short page."]
+
+    # Chunks respect chunk_size and repeat whole trailing sentences up to `overlap`
+    sentences = [f"Sentence number {i:02d} is here." for i in range(12)]
+    chunks = chunk_text(" ".join(sentences), chunk_size=120, overlap=60)
+    assert chunks == [" ".join(sentences[i:i + 4]) for i in range(0, 10, 2)]
+    assert all(len(c) <= 120 for c in chunks)
+
+    # A single sentence longer than chunk_size stays whole; the next chunk
+    # overlaps with its final words, cut at a word boundary
+    long_sentence = " ".join(f"word{i:03d}" for i in range(100)) + "."
+    chunks = chunk_text(long_sentence + " Short end.", chunk_size=500, overlap=100)
+    assert chunks[0] == long_sentence
+    assert chunks[1] == " ".join(f"word{i:03d}" for i in range(88, 100)) + ". Short end."
+    logger.info("  PASSED: Text chunking works correctly\n")
+
+
+def test_format_sql_result():
+    logger.info("=" * 50)
+    logger.info("TEST: SQL Result Formatting")
+    logger.info("=" * 50)
+    from utils.helpers import format_sql_result_as_text
+
+    assert format_sql_result_as_text(["n"], []) == "No results found."
+
+    # Expected strings are the output of the original per-cell ljust implementation
+    text = format_sql_result_as_text(
+        ["category", "fraud_count", "rate"],
+        [("grocery_pos", 2228, 1.41), ("shopping_net", 2219, None), ("misc_net", 1182, 1.45)],
+    )
+    assert text == (
+        "category     | fraud_count | rate\n"
+        "-------------+-------------+-----\n"
+        "grocery_pos  | 2228        | 1.41\n"
+        "shopping_net | 2219        | None\n"
+        "misc_net     | 1182        | 1.45"
+    )
+
+    text = format_sql_result_as_text(["n"], [(i,) for i in range(12)], max_rows=10)
+    assert text == "n\n-\n" + "\n".join(str(i) for i in range(10)) + "\n... and 2 more rows"
+    logger.info("  PASSED: SQL result formatting works correctly\n")
+
+
+@pytest.mark.network
+def test_rag_tool(vector_store_ready):
     logger.info("=" * 50)
     logger.info("TEST: RAG Tool")
     logger.info("=" * 50)
-    from tools.rag_tool import search_docs, format_rag_context
+    from tools.rag_tool import search_docs, format_rag_context, rag_cache_stats
 
     result = search_docs("primary methods of credit card fraud")
     logger.info(f"  Chunks: {len(result.chunks)}")
@@ -113,15 +271,22 @@ def test_rag_tool():
     context = format_rag_context(result)
     assert len(context) > 0, "Empty context"
     logger.info(f"  Context length: {len(context)} chars")
+
+    # Same question again, differing only in case/whitespace, is served from the cache
+    hits_before = rag_cache_stats()["hits"]
+    cached = search_docs("  Primary methods of credit card fraud ")
+    assert cached.chunks == result.chunks, "Cached result differs"
+    assert rag_cache_stats()["hits"] == hits_before + 1, "Repeated query missed the cache"
+    logger.info(f"  Cache stats: {rag_cache_stats()}")
     logger.info("  PASSED: RAG tool works correctly\n")
 
 
+@pytest.mark.network
 def test_query_classifier():
     logger.info("=" * 50)
     logger.info("TEST: Query Classifier")
     logger.info("=" * 50)
     from core.query_classifier import classify_query
-    from models.enums import QueryType
 
     test_cases = [
         ("How does the monthly fraud rate fluctuate over the two-year period?", [QueryType.SQL]),
@@ -140,6 +305,32 @@ def test_query_classifier():
     logger.info("  PASSED: Query classifier works\n")
 
 
+@pytest.mark.network
+def test_llm_classifier_drafts_sql(database_ready):
+    logger.info("=" * 50)
+    logger.info("TEST: LLM Classifier SQL Draft")
+    logger.info("=" * 50)
+    from core.query_classifier import classify_query, _score_keywords
+    from tools.sql_tool import clean_sql, validate_sql
+
+    # No keywords match, so the question is classified by the LLM
+    question = "How much money was lost to fraud in Texas during 2019?"
+    sql_score, rag_score, hybrid_score = _score_keywords(question)
+    assert hybrid_score == 0 and abs(sql_score - rag_score) < 2, "Question would be keyword-classified"
+
+    result = classify_query(question)
+    logger.info(f"  Type: {result.query_type} - {result.reasoning}")
+    logger.info(f"  Draft SQL: {result.sql_query}")
+    assert result.reasoning != "Fallback keyword-based classification", "LLM classification failed"
+    assert result.query_type in (QueryType.SQL, QueryType.HYBRID), f"Unexpected type: {result.query_type}"
+    assert result.sql_query, "Classifier did not draft SQL"
+
+    is_valid, msg = validate_sql(clean_sql(result.sql_query))
+    assert is_valid, f"Drafted SQL is invalid: {msg}"
+    logger.info("  PASSED: LLM classifier drafts valid SQL\n")
+
+
+@pytest.mark.network
 def test_quality_scorer():
     logger.info("=" * 50)
     logger.info("TEST: Quality Scorer")
@@ -173,72 +364,47 @@ def test_quality_scorer():
     logger.info("  PASSED: Quality scorer works\n")
 
 
-def test_end_to_end_questions():
+# Sample questions with the classification documented for each in the README
+SAMPLE_CASES = [
+    ("How does the daily or monthly fraud rate fluctuate over the two-year period?", QueryType.SQL),
+    ("Which merchants or merchant categories exhibit the highest incidence of fraudulent transactions?", QueryType.SQL),
+    ("What are the primary methods by which credit card fraud is committed?", QueryType.RAG),
+    ("What are the core components of an effective fraud detection system, according to the authors?", QueryType.RAG),
+    ("How much higher are fraud rates when the transaction counterpart is located outside the EEA?", QueryType.HYBRID),
+    ("What share of total card fraud value in H1 2023 was due to cross-border transactions?", QueryType.HYBRID),
+]
+SAMPLE_QUESTIONS = [question for question, _ in SAMPLE_CASES]
+
+
+# One node per question so pytest-xdist can spread them across workers
+@pytest.mark.network
+@pytest.mark.e2e
+@pytest.mark.parametrize(
+    "question,expected_type",
+    SAMPLE_CASES,
+    ids=[f"Q{i}" for i in range(1, len(SAMPLE_CASES) + 1)],
+)
+def test_end_to_end_questions(question, expected_type, e2e_responses):
     logger.info("=" * 50)
-    logger.info("TEST: End-to-End - All 6 Sample Questions")
+    logger.info(f"TEST: End-to-End - {question}")
     logger.info("=" * 50)
-    from core.agent import process_query
+    from core.agent import process_query, QUALITY_THRESHOLD
 
-    questions = [
-        "How does the daily or monthly fraud rate fluctuate over the two-year period?",
-        "Which merchants or merchant categories exhibit the highest incidence of fraudulent transactions?",
-        "What are the primary methods by which credit card fraud is committed?",
-        "What are the core components of an effective fraud detection system, according to the authors?",
-        "How much higher are fraud rates when the transaction counterpart is located outside the EEA?",
-        "What share of total card fraud value in H1 2023 was due to cross-border transactions?",
-    ]
+    response = e2e_responses.get(question) or process_query(question)
+    assert response is not None, "Agent returned no response"
+    score = response.quality_score.score if response.quality_score else 0
+    logger.info(f"  Type: {response.query_type}")
+    logger.info(f"  Score: {score}")
+    logger.info(f"  Sources: {response.sources}")
+    logger.info(f"  Answer: {response.answer[:200]}...")
+    logger.info(f"  Error: {response.error}")
 
-    results = []
-    for i, q in enumerate(questions, 1):
-        logger.info(f"\n  Q{i}: {q}")
-        response = process_query(q)
-        score = response.quality_score.score if response.quality_score else 0
-        logger.info(f"  Type: {response.query_type}")
-        logger.info(f"  Score: {score}")
-        logger.info(f"  Sources: {response.sources}")
-        logger.info(f"  Answer: {response.answer[:200]}...")
-        logger.info(f"  Error: {response.error}")
-        results.append({"question": q, "score": score, "type": response.query_type, "error": response.error})
-
-    logger.info("\n" + "=" * 50)
-    logger.info("SUMMARY")
-    logger.info("=" * 50)
-    for i, r in enumerate(results, 1):
-        status = "PASS" if r["score"] >= 3 and not r["error"] else "FAIL"
-        logger.info(f"  [{status}] Q{i}: score={r['score']}, type={r['type']}")
-    
-    passing = sum(1 for r in results if r["score"] >= 3 and not r["error"])
-    logger.info(f"\n  {passing}/{len(results)} questions passed (score >= 3)")
+    assert response.query_type == expected_type, f"Classified as {response.query_type}, expected {expected_type}"
+    assert not response.error, f"Agent returned an error: {response.error}"
+    assert score >= QUALITY_THRESHOLD, f"Quality score {score} is below {QUALITY_THRESHOLD}"
+    logger.info(f"  PASSED: score={score}, type={response.query_type}\n")
 
 
 if __name__ == "__main__":
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--quick", action="store_true", help="Run only quick unit tests (no LLM calls)")
-    parser.add_argument("--full", action="store_true", help="Run all tests including e2e")
-    args = parser.parse_args()
-
-    print("\n" + "=" * 60)
-    print("FRAUD ANALYSIS AGENT - BACKEND TESTS")
-    print("=" * 60 + "\n")
-
-    # Always run these (no LLM calls)
-    test_database()
-    test_sql_safety()
-
-    if not args.quick:
-        test_vector_store()
-        test_rag_tool()
-        test_sql_tool()
-        test_query_classifier()
-        test_quality_scorer()
-
-    if args.full:
-        test_end_to_end_questions()
-
-    if args.quick:
-        print("\n[Quick tests done. Use --full for end-to-end tests]")
-    elif not args.full:
-        print("\n[Component tests done. Use --full to also run 6 sample questions]")
-    else:
-        print("\n[All tests complete]")
+    # Convenience wrapper; flags are forwarded to pytest (see conftest.py)
+    sys.exit(pytest.main([__file__, *sys.argv[1:]]))
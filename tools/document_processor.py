@@ -1,7 +1,8 @@
 import logging
 import re
+from collections.abc import Iterator
 from pathlib import Path
-from PyPDF2 import PdfReader
+from models.schemas import Chunks
 
 logger = logging.getLogger(__name__)
 
@@ -9,20 +10,27 @@ DATASET_DIR = Path(__file__).parent.parent / "dataset"
 PDF_PATH = DATASET_DIR / "Understanding Credit Card Frauds.pdf"
 
 
-def extract_pdf_pages(pdf_path: Path = PDF_PATH) -> list[dict]:
+def iter_pdf_pages(pdf_path: Path = PDF_PATH) -> Iterator[dict]:
+    # One page of text at a time, so chunking can start before the whole PDF is read
+    # Imported here so importing this module doesn't load PyPDF2
+    from PyPDF2 import PdfReader
+
     reader = PdfReader(str(pdf_path))
-    pages = []
-    for i, page in enumerate(reader.pages):
-        text = page.extract_text() or ""
-        text = text.strip()
+    count = 0
+    texts = ((page.extract_text() or "").strip() for page in reader.pages)
+    for page_number, text in enumerate(texts, 1):
         if text:
-            pages.append({
-                "page_number": i + 1,
+            count += 1
+            yield {
+                "page_number": page_number,
                 "text": text,
                 "source": pdf_path.name,
-            })
-    logger.info(f"Extracted {len(pages)} pages from {pdf_path.name}")
-    return pages
+            }
+    logger.info(f"Extracted {count} pages from {pdf_path.name}")
+
+
+def extract_pdf_pages(pdf_path: Path = PDF_PATH) -> list[dict]:
+    return list(iter_pdf_pages(pdf_path))
 
 
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list[str]:
@@ -31,46 +39,80 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list[str
 
     # Split on sentence boundaries
     sentences = re.split(r'(?<=[.!?])\s+', text)
+    lens = [len(s) for s in sentences]
     chunks = []
-    current_chunk = ""
-
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) + 1 > chunk_size and current_chunk:
-            chunks.append(current_chunk.strip())
-            # Overlap: keep the tail of the current chunk
-            words = current_chunk.split()
-            overlap_text = " ".join(words[-overlap // 5:]) if len(words) > overlap // 5 else current_chunk
-            if len(overlap_text) > overlap:
-                overlap_text = overlap_text[-overlap:]
-            current_chunk = overlap_text + " " + sentence
-        else:
-            current_chunk = current_chunk + " " + sentence if current_chunk else sentence
-
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+    # The current chunk is held as pieces plus a running length (including the
+    # joining spaces) rather than a growing string
+    buf: list[str] = []
+    buf_len = 0
+    start = 0  # index of the first whole sentence in buf
+
+    for i, (sentence, n) in enumerate(zip(sentences, lens)):
+        if buf and buf_len + n + 1 > chunk_size:
+            chunks.append(" ".join(buf).strip())
+            # Overlap: walk back over whole trailing sentences that fit in `overlap`
+            j = i
+            tail_len = 0
+            while j > start:
+                added = lens[j - 1] + (1 if j < i else 0)  # plus a joining space
+                if tail_len + added > overlap:
+                    break
+                tail_len += added
+                j -= 1
+            if j < i:
+                buf = sentences[j:i]
+            else:
+                # The last sentence alone is too long; keep its final words
+                tail = sentences[i - 1][-overlap:]
+                space = tail.find(" ")
+                buf = [tail[space + 1:] if 0 <= space < len(tail) - 1 else tail]
+                tail_len = len(buf[0])
+            buf_len = tail_len
+            start = i
+        if buf:
+            buf_len += 1
+        buf.append(sentence)
+        buf_len += n
+
+    if buf:
+        last = " ".join(buf).strip()
+        if last:
+            chunks.append(last)
+
+    return chunks
+
 
+def process_pdf(pdf_path: Path = PDF_PATH) -> Chunks:
+    chunks = Chunks()
+    for batch in process_pdf_batched(pdf_path):
+        chunks.extend(batch)
     return chunks
 
 
-def process_pdf(pdf_path: Path = PDF_PATH) -> list[dict]:
-    pages = extract_pdf_pages(pdf_path)
-    all_chunks = []
+def process_pdf_batched(pdf_path: Path = PDF_PATH, batch_size: int = 64) -> Iterator[Chunks]:
+    # Yields chunks as soon as batch_size are ready, so embedding can start
+    # while later pages are still being chunked
+    batch = Chunks()
     chunk_id = 0
+    page_count = 0
 
-    for page_data in pages:
+    for page_data in iter_pdf_pages(pdf_path):
+        page_count += 1
         page_chunks = chunk_text(page_data["text"])
         for i, chunk in enumerate(page_chunks):
-            all_chunks.append({
-                "id": f"chunk_{chunk_id}",
-                "text": chunk,
-                "metadata": {
-                    "page_number": page_data["page_number"],
-                    "chunk_index": i,
-                    "source": page_data["source"],
-                    "total_chunks_in_page": len(page_chunks),
-                },
+            batch.ids.append(f"chunk_{chunk_id}")
+            batch.texts.append(chunk)
+            batch.metadatas.append({
+                "page_number": page_data["page_number"],
+                "chunk_index": i,
+                "source": page_data["source"],
+                "total_chunks_in_page": len(page_chunks),
             })
             chunk_id += 1
+            if len(batch) >= batch_size:
+                yield batch
+                batch = Chunks()
 
-    logger.info(f"Processed {len(all_chunks)} chunks from {len(pages)} pages")
-    return all_chunks
+    if batch:
+        yield batch
+    logger.info(f"Processed {chunk_id} chunks from {page_count} pages")
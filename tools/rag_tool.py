@@ -1,40 +1,145 @@
 import logging
-from services.vector_store import search_documents, is_vector_store_ready
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from services.vector_store import search_documents, search_documents_batch, is_vector_store_ready
 from models.schemas import RAGResult
 
 logger = logging.getLogger(__name__)
 
+CacheKey = tuple[str, int]  # (normalized query, n_results)
+
+
+@dataclass
+class CacheEntry:
+    result: RAGResult
+    inserted_at: float
+
+
+class SmartRAGCache:
+    # LRU cache of retrieval results with a time-to-live, safe across threads
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[CacheKey, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> RAGResult | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.inserted_at > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+
+    def put(self, key: CacheKey, result: RAGResult):
+        with self._lock:
+            self._entries[key] = CacheEntry(result, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_cache = SmartRAGCache()
+
+
+def rag_cache_stats() -> dict:
+    return _cache.stats()
+
+
+def _cache_key(query: str, n_results: int) -> CacheKey:
+    return " ".join(query.lower().split()), n_results
+
 
 def search_docs(query: str, n_results: int = 7) -> RAGResult:
+    # Repeated questions skip the readiness probe, the query embedding and the vector search
+    key = _cache_key(query, n_results)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
     if not is_vector_store_ready():
         return RAGResult(error="Vector store is not initialized. Please run data setup first.")
 
     try:
-        results = search_documents(query, n_results=n_results)
-        
-        chunks = results.get("documents", [])
-        metadatas = results.get("metadatas", [])
-        distances = results.get("distances", [])
-        
-        if not chunks:
-            return RAGResult(
-                chunks=[],
-                metadatas=[],
-                distances=[],
-                error="No relevant documents found for this query.",
-            )
-        
-        return RAGResult(
-            chunks=chunks,
-            metadatas=metadatas,
-            distances=distances,
-        )
+        result = _to_rag_result(search_documents(query, n_results=n_results))
+        # Only successful retrievals are cached
+        if not result.error:
+            _cache.put(key, result)
+        return result
 
     except Exception as e:
         logger.error(f"RAG search error: {e}")
         return RAGResult(error=f"Document retrieval failed: {str(e)}")
 
 
+def search_docs_batch(queries: list[str], n_results: int = 7) -> list[RAGResult]:
+    # Cache misses are retrieved together: one embedding call, one vector search
+    keys = [_cache_key(q, n_results) for q in queries]
+    results = [_cache.get(key) for key in keys]
+    misses = [i for i, r in enumerate(results) if r is None]
+    if not misses:
+        return results
+
+    if not is_vector_store_ready():
+        for i in misses:
+            results[i] = RAGResult(error="Vector store is not initialized. Please run data setup first.")
+        return results
+
+    try:
+        batch = search_documents_batch([queries[i] for i in misses], n_results=n_results)
+    except Exception as e:
+        logger.error(f"RAG batch search error: {e}")
+        for i in misses:
+            results[i] = RAGResult(error=f"Document retrieval failed: {str(e)}")
+        return results
+
+    for i, raw in zip(misses, batch):
+        results[i] = _to_rag_result(raw)
+        if not results[i].error:
+            _cache.put(keys[i], results[i])
+    return results
+
+
+def _to_rag_result(results: dict) -> RAGResult:
+    chunks = results.get("documents", [])
+    metadatas = results.get("metadatas", [])
+    distances = results.get("distances", [])
+
+    if not chunks:
+        return RAGResult(
+            chunks=[],
+            metadatas=[],
+            distances=[],
+            error="No relevant documents found for this query.",
+        )
+
+    return RAGResult(
+        chunks=chunks,
+        metadatas=metadatas,
+        distances=distances,
+    )
+
+
 def format_rag_context(rag_result: RAGResult) -> str:
     if rag_result.error or not rag_result.chunks:
         return ""
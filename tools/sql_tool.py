@@ -1,7 +1,8 @@
-import re
 import sqlite3
 import logging
-from services.database import execute_query, get_connection, get_table_schema
+import threading
+from collections import OrderedDict
+from services.database import execute_query, get_readonly_connection, get_table_schema
 from services.together_ai import chat_completion_routing
 from models.schemas import SQLResult
 from utils.helpers import is_safe_sql
@@ -16,7 +17,7 @@ You will be given a natural language question and must generate a valid SQLite S
 RULES:
 1. ONLY generate SELECT statements. Never use INSERT, UPDATE, DELETE, DROP, ALTER, or PRAGMA.
 2. Use strftime() for date grouping. Examples:
-   - Monthly: strftime('%Y-%m', trans_date_trans_time)
+   - Monthly: trans_month (indexed 'YYYY-MM' column; prefer it over strftime)
    - Daily: strftime('%Y-%m-%d', trans_date_trans_time)
    - Yearly: strftime('%Y', trans_date_trans_time)
 3. Always include appropriate WHERE clauses when filtering.
@@ -27,7 +28,7 @@ RULES:
 EXAMPLES:
 
 Question: "What is the monthly fraud rate?"
-SQL: SELECT strftime('%Y-%m', trans_date_trans_time) AS month, ROUND(AVG(is_fraud) * 100, 2) AS fraud_rate_pct FROM fraud_transactions GROUP BY month ORDER BY month
+SQL: SELECT trans_month AS month, ROUND(AVG(is_fraud) * 100, 2) AS fraud_rate_pct FROM fraud_transactions GROUP BY trans_month ORDER BY trans_month
 
 Question: "Which categories have the most fraud?"
 SQL: SELECT category, COUNT(*) AS fraud_count, ROUND(CAST(COUNT(*) AS REAL) / (SELECT COUNT(*) FROM fraud_transactions WHERE is_fraud = 1) * 100, 2) AS pct_of_total_fraud FROM fraud_transactions WHERE is_fraud = 1 GROUP BY category ORDER BY fraud_count DESC LIMIT 10
@@ -40,25 +41,63 @@ Return ONLY the SQL query, nothing else. No markdown, no explanation, no code bl
 """
 
 
+_SYSTEM_MESSAGE: dict | None = None
+
+# Rows kept from a query result; SQLite stops producing rows past this
+MAX_RESULT_ROWS = 100
+
+# SQL that validated and executed for a normalized question, evicted LRU
+SQL_CACHE_SIZE = 512
+_sql_cache: OrderedDict[str, str] = OrderedDict()
+_sql_cache_lock = threading.Lock()
+
+# EXPLAIN outcomes per exact SQL string, evicted FIFO
+VALIDATION_CACHE_SIZE = 512
+_validation_cache: dict[str, tuple[bool, str]] = {}
+_validation_cache_lock = threading.Lock()
+_TRANSIENT_SQLITE_ERRORS = ("database is locked", "database table is locked", "unable to open database", "disk i/o error")
+# Reported like syntax errors, but they resolve once setup or migration has run
+_SCHEMA_SQLITE_ERRORS = ("no such table", "no such column")
+
+
+def _get_system_message() -> dict:
+    # The schema never changes while the app runs, so the system message is
+    # built once and every request shares the same prompt prefix
+    global _SYSTEM_MESSAGE
+    if _SYSTEM_MESSAGE is None:
+        _SYSTEM_MESSAGE = {"role": "system", "content": SQL_SYSTEM_PROMPT.format(schema=get_table_schema())}
+    return _SYSTEM_MESSAGE
+
+
 def generate_sql(question: str, model: str | None = None) -> str:
-    schema = get_table_schema()
     messages = [
-        {"role": "system", "content": SQL_SYSTEM_PROMPT.format(schema=schema)},
+        _get_system_message(),
         {"role": "user", "content": f"Generate a SQLite SELECT query for this question:\n\n{question}"},
     ]
     
     raw = chat_completion_routing(messages)
-    
+    return clean_sql(raw)
+
+
+def clean_sql(raw: str) -> str:
     # Clean up the response - strip markdown code blocks if present
     sql = raw.strip()
-    sql = re.sub(r'^```(?:sql)?\s*', '', sql)
-    sql = re.sub(r'\s*```$', '', sql)
-    sql = sql.strip().rstrip(';') + ';' if not sql.strip().endswith(';') else sql.strip()
-    
+    if sql.startswith("```"):
+        # Only the fence and an optional language tag; SQL may follow on the same line
+        sql = sql[3:].removeprefix("sql").lstrip()
+    if sql.endswith("```"):
+        sql = sql[:-3]
+    sql = sql.strip().rstrip(";") + ";"
+
     return sql
 
 
 def validate_sql(sql: str) -> tuple[bool, str]:
+    with _validation_cache_lock:
+        cached = _validation_cache.get(sql)
+    if cached is not None:
+        return cached
+
     # Check safety
     if not is_safe_sql(sql):
         return False, "Query contains forbidden operations (only SELECT is allowed)"
@@ -67,29 +106,100 @@ def validate_sql(sql: str) -> tuple[bool, str]:
     if not sql.strip().upper().startswith("SELECT"):
         return False, "Query must start with SELECT"
     
+    # Connection failures say nothing about the SQL, so they are never cached
+    try:
+        conn = get_readonly_connection()
+    except Exception as e:
+        return False, f"Validation error: {str(e)}"
+
     # Try EXPLAIN to check syntax
     try:
-        conn = get_connection()
         conn.execute(f"EXPLAIN {sql.rstrip(';')}")
-        conn.close()
-        return True, "Valid"
+        result = True, "Valid"
     except sqlite3.OperationalError as e:
-        return False, f"SQL syntax error: {str(e)}"
+        if _is_transient_error(e):
+            return False, f"Validation error: {str(e)}"
+        result = False, f"SQL syntax error: {str(e)}"
+        if _is_schema_error(e):
+            return result
     except Exception as e:
+        # Not cached: may be transient (e.g. database not set up yet)
         return False, f"Validation error: {str(e)}"
 
+    with _validation_cache_lock:
+        if len(_validation_cache) >= VALIDATION_CACHE_SIZE:
+            _validation_cache.pop(next(iter(_validation_cache)))
+        _validation_cache[sql] = result
+    return result
+
+
+def _is_transient_error(e: sqlite3.OperationalError) -> bool:
+    # Lock and file errors depend on the database's state, not on the SQL text
+    message = str(e).lower()
+    return any(marker in message for marker in _TRANSIENT_SQLITE_ERRORS)
+
+
+def _is_schema_error(e: sqlite3.OperationalError) -> bool:
+    message = str(e).lower()
+    return any(marker in message for marker in _SCHEMA_SQLITE_ERRORS)
+
+
+def _normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
 
-def run_sql_query(question: str, max_retries: int = 2) -> SQLResult:
+def _get_cached_sql(key: str) -> str | None:
+    with _sql_cache_lock:
+        sql = _sql_cache.get(key)
+        if sql is not None:
+            _sql_cache.move_to_end(key)
+        return sql
+
+
+def _put_cached_sql(key: str, sql: str):
+    with _sql_cache_lock:
+        _sql_cache[key] = sql
+        _sql_cache.move_to_end(key)
+        if len(_sql_cache) > SQL_CACHE_SIZE:
+            _sql_cache.popitem(last=False)
+
+
+def run_sql_query(
+    question: str,
+    max_retries: int = 2,
+    draft_sql: str | None = None,
+    use_cache: bool = True,
+) -> SQLResult:
     last_error = ""
+    cache_key = _normalize_question(question)
+    cached_sql = _get_cached_sql(cache_key) if use_cache else None
+    prev_sql = None
+    prev_invalid = False
     
     for attempt in range(max_retries + 1):
         try:
-            # Generate SQL
-            sql = generate_sql(question)
+            # Generate SQL, starting from a previously working query or the
+            # classifier's draft; later attempts always ask the model again
+            if attempt == 0 and cached_sql:
+                sql = cached_sql
+                logger.info("Reusing cached SQL for repeated question")
+            elif attempt == 0 and draft_sql:
+                sql = clean_sql(draft_sql)
+            else:
+                sql = generate_sql(question)
             logger.info(f"Generated SQL (attempt {attempt + 1}): {sql}")
+
+            # A repeated query will fail the same way again, so stop retrying
+            if sql == prev_sql:
+                logger.warning("Regenerated SQL is unchanged; not retrying further")
+                if prev_invalid:
+                    return SQLResult(query=sql, error=f"Invalid SQL after {attempt + 1} attempts: {last_error}")
+                break
+            prev_sql = sql
             
             # Validate
             is_valid, msg = validate_sql(sql)
+            prev_invalid = not is_valid
             if not is_valid:
                 last_error = msg
                 logger.warning(f"SQL validation failed: {msg}")
@@ -98,11 +208,9 @@ def run_sql_query(question: str, max_retries: int = 2) -> SQLResult:
                 return SQLResult(query=sql, error=f"Invalid SQL after {max_retries + 1} attempts: {msg}")
             
             # Execute
-            columns, rows = execute_query(sql)
-            
-            # Limit rows
-            if len(rows) > 100:
-                rows = rows[:100]
+            columns, rows = execute_query(sql, max_rows=MAX_RESULT_ROWS)
+
+            _put_cached_sql(cache_key, sql)
             
             return SQLResult(
                 query=sql,
@@ -122,4 +230,4 @@ def run_sql_query(question: str, max_retries: int = 2) -> SQLResult:
             logger.error(f"Unexpected error in SQL tool: {e}")
             break
     
-    return SQLResult(query="", error=f"SQL query failed after {max_retries + 1} attempts: {last_error}")
+    return SQLResult(query="", error=f"SQL query failed after {attempt + 1} attempts: {last_error}")
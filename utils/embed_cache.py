@@ -0,0 +1,54 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+CACHE_PATH = DATA_DIR / "embedding_cache.db"
+
+_local = threading.local()
+
+
+def _get_connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(CACHE_PATH))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+        _local.conn = conn
+    return conn
+
+
+def _key(model: str, text: str) -> bytes:
+    return hashlib.blake2b(f"{model}\x00{text}".encode(), digest_size=16).digest()
+
+
+def get_cached_embeddings(model: str, texts: list[str]) -> list[list[float] | None]:
+    # Returns one entry per text, None where the embedding is not cached
+    conn = _get_connection()
+    keys = [_key(model, t) for t in texts]
+    found = {}
+    for i in range(0, len(keys), 500):  # stay under SQLite's host parameter limit
+        chunk = keys[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})", chunk)
+        found.update(rows)
+    return [
+        np.frombuffer(found[k], dtype=np.float32).tolist() if k in found else None
+        for k in keys
+    ]
+
+
+def put_cached_embeddings(model: str, texts: list[str], embeddings: list[list[float]]) -> None:
+    conn = _get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (hash, vec) VALUES (?, ?)",
+            (
+                (_key(model, t), np.asarray(e, dtype=np.float32).tobytes())
+                for t, e in zip(texts, embeddings)
+            ),
+        )
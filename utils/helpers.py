@@ -1,11 +1,26 @@
 import os
 import re
-from dotenv import load_dotenv
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
 
-load_dotenv()
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+# Matched against upper-cased SQL, so no IGNORECASE is needed
+_FORBIDDEN_SQL = re.compile(
+    r'\b(DROP|DELETE|INSERT|UPDATE|ALTER|CREATE|PRAGMA|ATTACH|DETACH|REPLACE|TRUNCATE)\b'
+)
+
+
+@lru_cache(maxsize=1)
+def _load_dotenv():
+    # Read .env on first lookup rather than whenever this module is imported
+    from dotenv import load_dotenv
+
+    load_dotenv()
 
 
 def get_env(key: str, default: str = "") -> str:
+    _load_dotenv()
     return os.getenv(key, default)
 
 
@@ -28,6 +43,26 @@ def get_embedding_model() -> str:
     return get_env("EMBEDDING_MODEL", "togethercomputer/m2-bert-80M-8k-retrieval")
 
 
+def get_embedding_backend() -> str:
+    # "together" (API) or "local" (ONNX model on disk)
+    return get_env("EMBEDDING_BACKEND", "together").strip().lower()
+
+
+def get_local_embedding_dir() -> Path:
+    default = Path(__file__).parent.parent / "data" / "all-MiniLM-L6-v2"
+    return Path(get_env("LOCAL_EMBEDDING_DIR", str(default)))
+
+
+def get_vector_backend() -> str:
+    # "chroma" (default) or "faiss"
+    return get_env("VECTOR_STORE_BACKEND", "chroma").strip().lower()
+
+
+def get_faiss_quantization() -> str:
+    # "fp16" (default), "int8", "pq" (product quantization), or "none" for float32
+    return get_env("FAISS_QUANTIZATION", "fp16").strip().lower()
+
+
 def sanitize_input(text: str) -> str:
     text = text.strip()
     if len(text) > 2000:
@@ -35,30 +70,36 @@ def sanitize_input(text: str) -> str:
     return text
 
 
+def extract_json_object(text: str) -> str:
+    # Single scan for the outermost {...}, ignoring code fences and surrounding prose
+    match = _JSON_OBJECT_RE.search(text)
+    return match.group(0) if match else text
+
+
+def normalize_embeddings(embeddings: list[list[float]]) -> np.ndarray:
+    # Unit-length rows, so inner product equals cosine similarity
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    return vectors
+
+
 def is_safe_sql(sql: str) -> bool:
-    forbidden = re.compile(
-        r'\b(DROP|DELETE|INSERT|UPDATE|ALTER|CREATE|PRAGMA|ATTACH|DETACH|REPLACE|TRUNCATE)\b',
-        re.IGNORECASE
-    )
-    return not forbidden.search(sql)
+    return _FORBIDDEN_SQL.search(sql.upper()) is None
 
 
-def format_sql_result_as_text(columns: list[str], rows: list[list], max_rows: int = 20) -> str:
+def format_sql_result_as_text(columns: list[str], rows: list[tuple], max_rows: int = 20) -> str:
     if not rows:
         return "No results found."
 
-    display_rows = rows[:max_rows]
-    col_widths = [len(str(c)) for c in columns]
-    for row in display_rows:
-        for i, val in enumerate(row):
-            col_widths[i] = max(col_widths[i], len(str(val)))
+    header = [str(c) for c in columns]
+    cells = [[str(v) for v in row] for row in rows[:max_rows]]
+    # Column-wise widths in one pass, then a single format template per row
+    col_widths = [max(map(len, col)) for col in zip(header, *cells)]
+    row_fmt = " | ".join(f"{{:<{w}}}" for w in col_widths)
 
-    header = " | ".join(str(c).ljust(w) for c, w in zip(columns, col_widths))
     separator = "-+-".join("-" * w for w in col_widths)
-    lines = [header, separator]
-    for row in display_rows:
-        line = " | ".join(str(v).ljust(w) for v, w in zip(row, col_widths))
-        lines.append(line)
+    lines = [row_fmt.format(*header), separator]
+    lines.extend(row_fmt.format(*row) for row in cells)
 
     if len(rows) > max_rows:
         lines.append(f"... and {len(rows) - max_rows} more rows")